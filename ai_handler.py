@@ -1,11 +1,122 @@
 import google.generativeai as genai
+import google.ai.generativelanguage as glm
 from datetime import datetime, timedelta
+import asyncio
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import time
-import random
-from config import API_KEYS, DEBUG_MODE
+from config import (
+    API_KEYS, DEBUG_MODE, MAX_CONCURRENT_GENERATIONS, GENERATION_EXECUTOR_WORKERS,
+    MAX_HISTORY_LENGTH, CHAT_SESSION_MAX, CHAT_SESSION_IDLE_TIMEOUT, PROMPT_TOKEN_BUDGET,
+    KEY_ACQUIRE_TIMEOUT, GLOBAL_BREAKER_THRESHOLD, GLOBAL_BREAKER_RESET_TIMEOUT
+)
+from prompt_builder import estimate_tokens
+from shared_state import create_key_scheduler, key_id
+from db_handler import KEY_HEALTH_COUNTERS
+import metrics
+from resilience import (
+    GenerationError, RetryPolicy, CircuitBreaker, classify_error, retry_after_seconds,
+    RATE_LIMITED, KEY_INVALID, FATAL
+)
 import sys
 import traceback
 
+# Model reply that closes the persona exchange at the start of every chat
+PERSONA_ACKNOWLEDGEMENT = "Understood. I will stay in character."
+
+class KeyBoundModel(genai.GenerativeModel):
+    """GenerativeModel that always calls the API with its own key instead of genai.configure's global one"""
+    def __init__(self, api_key, model_name='gemini-pro'):
+        super().__init__(model_name)
+        self.api_key = api_key
+        self._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+
+    async def generate_content_async(self, *args, **kwargs):
+        # The async transport must be created inside the running event loop
+        if self._async_client is None:
+            self._async_client = glm.GenerativeServiceAsyncClient(client_options={"api_key": self.api_key})
+        return await super().generate_content_async(*args, **kwargs)
+
+class ChatSessionPool:
+    """Live chat sessions keyed by conversation, evicted when idle or over capacity"""
+    def __init__(self, max_sessions=CHAT_SESSION_MAX, idle_timeout=CHAT_SESSION_IDLE_TIMEOUT,
+                 max_turns=MAX_HISTORY_LENGTH, token_budget=PROMPT_TOKEN_BUDGET):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.sessions = OrderedDict()
+        self.reused = 0
+        self.created = 0
+        self.evicted = 0
+
+    def get(self, key, persona_prompt, temperature):
+        """Return the live chat for `key`, or None if missing, idle-expired or built for other settings"""
+        self.evict_idle()
+        entry = self.sessions.get(key)
+        if entry is None:
+            return None
+        
+        chat, _ = entry
+        if chat.persona_prompt != persona_prompt or chat.generation_config["temperature"] != temperature:
+            self.discard(key)
+            return None
+        
+        self.sessions[key] = (chat, time.monotonic())
+        self.sessions.move_to_end(key)
+        self.reused += 1
+        return chat
+
+    def put(self, key, chat):
+        """Add a chat, evicting the least recently used sessions over max_sessions"""
+        self.sessions[key] = (chat, time.monotonic())
+        self.sessions.move_to_end(key)
+        self.created += 1
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+            self.evicted += 1
+
+    def trim(self, chat):
+        """Keep the persona exchange plus the newest exchanges that fit max_turns and the token budget"""
+        history = chat.history
+        seed, turns = history[:2], history[2:]
+        if len(turns) > self.max_turns * 2:
+            turns = turns[-self.max_turns * 2:]
+        
+        tokens = sum(estimate_tokens(part.text) for content in history for part in content.parts)
+        while len(turns) > 2 and tokens > self.token_budget:
+            dropped, turns = turns[:2], turns[2:]
+            tokens -= sum(estimate_tokens(part.text) for content in dropped for part in content.parts)
+        
+        if len(turns) != len(history) - 2:
+            chat.history = seed + turns
+
+    def discard(self, key):
+        self.sessions.pop(key, None)
+
+    def clear(self):
+        self.sessions.clear()
+
+    def evict_idle(self):
+        """Drop sessions unused for longer than idle_timeout (oldest are at the front)"""
+        cutoff = time.monotonic() - self.idle_timeout
+        while self.sessions:
+            _, last_used = next(iter(self.sessions.values()))
+            if last_used >= cutoff:
+                break
+            self.sessions.popitem(last=False)
+            self.evicted += 1
+
+    def stats(self):
+        """Get pool statistics"""
+        return {
+            "active_sessions": len(self.sessions),
+            "created": self.created,
+            "reused": self.reused,
+            "evicted": self.evicted
+        }
+
 class AIHandler:
     def __init__(self):
         self.current_key_index = 0
@@ -17,7 +128,26 @@ class AIHandler:
                 "last_request": None
             } for key in API_KEYS
         }
+        # Counter values already in the database (see export_key_health)
+        self.saved_counts = {key: {field: 0 for field in KEY_HEALTH_COUNTERS} for key in API_KEYS}
         self.startup_time = datetime.utcnow()
+        # Bounds the number of Gemini calls in flight so the event loop stays responsive
+        self.generation_semaphore = asyncio.Semaphore(MAX_CONCURRENT_GENERATIONS)
+        # Used for blocking SDK calls that have no async counterpart
+        self.executor = ThreadPoolExecutor(
+            max_workers=GENERATION_EXECUTOR_WORKERS,
+            thread_name_prefix="gemini"
+        )
+        self.in_flight = 0
+        self.session_pool = ChatSessionPool()
+        # Shared with other worker processes when SHARED_STATE_PATH is set
+        self.key_scheduler = create_key_scheduler(API_KEYS)
+        self.retry_policy = RetryPolicy()
+        # Trips when requests keep failing across all keys, so an outage fails fast
+        self.global_breaker = CircuitBreaker("gemini", GLOBAL_BREAKER_THRESHOLD, GLOBAL_BREAKER_RESET_TIMEOUT)
+        self.fast_failures = 0
+        # One model per key; requests pick a model explicitly so concurrent calls never share a key
+        self.models = {}
         print(f"AI Handler initialized at {self.startup_time.strftime('%Y-%m-%d %H:%M:%S')} UTC")
         print(f"Number of API keys loaded: {len(API_KEYS)}")
         self.initialize_api()
@@ -37,144 +167,456 @@ class AIHandler:
             print(f"[{current_time}] INFO: {message}")
 
     def initialize_api(self):
-        """Initialize the API with the current key"""
+        """Create a key-bound model for every API key"""
         if not API_KEYS:
             raise ValueError("No API keys available in configuration")
         try:
-            genai.configure(api_key=API_KEYS[self.current_key_index])
-            self.model = genai.GenerativeModel('gemini-pro')
-            self.log_info(f"Initialized with API key index {self.current_key_index}")
+            for key in API_KEYS:
+                self.models[key] = KeyBoundModel(key)
+            self.model = self.models[API_KEYS[self.current_key_index]]
+            self.log_info(f"Initialized {len(self.models)} key-bound models")
         except Exception as e:
             self.log_error("Failed to initialize API", e)
             raise
 
-    def get_next_valid_key(self):
-        """Get the next valid API key with improved error handling"""
-        original_index = self.current_key_index
-        current_time = datetime.utcnow()
-        
-        # Reset error counts for keys that haven't had errors in the last hour
-        for key in API_KEYS:
-            last_error = self.key_status[key]["last_error"]
-            if last_error and (current_time - last_error) > timedelta(hours=1):
-                self.key_status[key]["errors"] = 0
-                self.key_status[key]["last_error"] = None
-                self.log_info(f"Reset error count for key ending in ...{key[-4:]}")
+    def get_model(self, key):
+        """Get the model bound to the given key"""
+        return self.models[key]
 
-        tried_keys = set()
-        while len(tried_keys) < len(API_KEYS):
-            self.current_key_index = (self.current_key_index + 1) % len(API_KEYS)
-            current_key = API_KEYS[self.current_key_index]
-            
-            if self.current_key_index not in tried_keys:
-                tried_keys.add(self.current_key_index)
-                
-                # Check if this key is valid (less than 5 errors in the last hour)
-                if self.key_status[current_key]["errors"] < 5:
-                    self.log_info(f"Switched to API key index {self.current_key_index}")
-                    return current_key
-
-        # If we've tried all keys and none are valid, find the least errored key
-        min_errors = min(self.key_status[key]["errors"] for key in API_KEYS)
-        valid_keys = [
-            i for i, key in enumerate(API_KEYS)
-            if self.key_status[key]["errors"] == min_errors
-        ]
+    def reset_expired_errors(self, key):
+        """Reset a key's error count once its last error is more than an hour old"""
+        last_error = self.key_status[key]["last_error"]
+        if last_error and (datetime.utcnow() - last_error) > timedelta(hours=1):
+            self.key_status[key]["errors"] = 0
+            self.key_status[key]["last_error"] = None
+            self.log_info(f"Reset error count for key ending in ...{key[-4:]}")
 
-        if valid_keys:
-            self.current_key_index = random.choice(valid_keys)
-            self.log_info(f"Falling back to least errored key index {self.current_key_index}")
-            return API_KEYS[self.current_key_index]
-        
-        raise Exception("All API keys are experiencing issues. Please try again later.")
+    def get_next_valid_key(self, estimated_tokens=0, exclude=()):
+        """Reserve the key with the most rate-limit headroom for one request (sync callers, off the event loop)"""
+        key = self.key_scheduler.try_acquire(estimated_tokens, exclude)
+        if key is None:
+            raise GenerationError("All API keys are rate limited or cooling down. Please try again later.", RATE_LIMITED)
+        self.reset_expired_errors(key)
+        self.current_key_index = API_KEYS.index(key)
+        return key
+
+    async def acquire_key(self, estimated_tokens=0, exclude=()):
+        """Reserve a key, waiting up to KEY_ACQUIRE_TIMEOUT seconds for rate-limit headroom"""
+        key = await self.key_scheduler.acquire(estimated_tokens, exclude, timeout=KEY_ACQUIRE_TIMEOUT)
+        if key is None:
+            raise GenerationError("All API keys are rate limited or cooling down. Please try again later.", RATE_LIMITED)
+        self.reset_expired_errors(key)
+        self.current_key_index = API_KEYS.index(key)
+        return key
+
+    def retry_exclusions(self, tried_keys):
+        """Prefer untried keys; once every key has been tried, any key may be retried"""
+        return tried_keys if len(tried_keys) < len(API_KEYS) else set()
+
+    def check_global_breaker(self):
+        """Fail fast while the global circuit breaker is open"""
+        if not self.global_breaker.allow():
+            self.fast_failures += 1
+            raise GenerationError(
+                f"The AI service is unavailable right now. Please try again in {self.global_breaker.retry_in():.0f}s."
+            )
+
+    def record_error(self, key, error=None, started=None):
+        """Classify an error, back off or trip the key accordingly, and return the error category"""
+        category = classify_error(error) if error is not None else None
+        delay = self.update_key_after_error(key, error, category)
+        return self.count_error(key, error, category, delay, started)
 
-    def record_error(self, key):
-        """Record an error for the given key"""
+    async def record_error_async(self, key, error=None, started=None):
+        """record_error for async callers; the key scheduler is updated off the event loop"""
+        category = classify_error(error) if error is not None else None
+        delay = await self.key_scheduler.run(self.update_key_after_error, key, error, category)
+        return self.count_error(key, error, category, delay, started)
+
+    def update_key_after_error(self, key, error, category):
+        """Back off or trip the key in the scheduler; returns the backoff delay (None when it served the request)"""
+        if category == FATAL:
+            # The key served the request; the request itself was rejected
+            self.key_scheduler.record_success(key)
+            return None
+        return self.key_scheduler.record_failure(
+            key,
+            retry_after_seconds(error),
+            breaker_failure=category != RATE_LIMITED,
+            trip=category == KEY_INVALID
+        )
+
+    def count_error(self, key, error, category, delay, started=None):
+        """Count and log an error the key scheduler has already seen, and return its category"""
+        if started is not None:
+            metrics.observe_gemini(key, category or "error", time.monotonic() - started)
+        if category == FATAL:
+            self.log_error(f"Request rejected on key ending in ...{key[-4:]}: {error}")
+            return category
+        
         self.key_status[key]["errors"] += 1
         self.key_status[key]["last_error"] = datetime.utcnow()
-        self.log_error(f"Error recorded for key ending in ...{key[-4:]}")
+        self.log_error(f"Error ({category}) recorded for key ending in ...{key[-4:]}, backing off {delay:.0f}s")
+        return category
+
+    def fail_request(self, error, category, upstream=True):
+        """Update the global breaker for a request that gave up, and build the error to raise.
+
+        upstream is False when no call reached Gemini (our own key budget was used up or acquiring a
+        key timed out); a local load spike must not open the breaker.
+        """
+        if not upstream:
+            return error
+        if category == FATAL:
+            self.global_breaker.record_success()
+            return GenerationError("I can't respond to that message.", FATAL)
+        self.global_breaker.record_failure()
+        if isinstance(error, GenerationError):
+            return error
+        return GenerationError(f"All API keys failed. Please try again later. Details: {str(error)}", category)
 
-    def record_request(self, key):
-        """Record a successful request for the given key"""
+    def daily_usage(self, key):
+        """Requests and tokens counted against the key's quota today (UTC), across all workers"""
+        return self.key_scheduler.daily_usage(key)
+
+    def record_request(self, key, response_text="", started=None):
+        """Record a successful request for the given key; `started` is its time.monotonic() start"""
+        quota_spent = self.key_scheduler.record_completion(key, estimate_tokens(response_text))
+        self.count_request(key, response_text, started, quota_spent)
+
+    async def record_request_async(self, key, response_text="", started=None):
+        """record_request for async callers; the key scheduler is updated off the event loop"""
+        quota_spent = await self.key_scheduler.run(
+            self.key_scheduler.record_completion, key, estimate_tokens(response_text)
+        )
+        self.count_request(key, response_text, started, quota_spent)
+
+    def count_request(self, key, response_text="", started=None, quota_spent=False):
+        """Update a key's request counters and metrics after a successful request"""
         self.key_status[key]["total_requests"] += 1
         self.key_status[key]["last_request"] = datetime.utcnow()
+        if quota_spent:
+            self.log_error(f"Daily quota reached for key ending in ...{key[-4:]}; resting until UTC midnight")
+        metrics.GEMINI_TOKENS.inc(estimate_tokens(response_text), key=metrics.key_label(key))
+        if started is not None:
+            metrics.observe_gemini(key, "success", time.monotonic() - started)
         if DEBUG_MODE:
             self.log_info(f"Request recorded for key ending in ...{key[-4:]}")
 
-    def create_chat(self, persona_prompt, temperature):
-        """Create a chat session with error handling and key rotation"""
-        max_retries = len(API_KEYS)
-        current_retry = 0
+    def create_chat(self, persona_prompt, temperature, history=None, summary=""):
+        """Create a chat session seeded with the persona, summary and prior turns (no network call)"""
+        # The chat is rebound to the dispatched key's model on every send
+        chat = self.model.start_chat(history=self.build_seed_history(persona_prompt, history or [], summary))
+        chat.persona_prompt = persona_prompt
+        chat.generation_config = {
+            "temperature": temperature,
+            "top_p": 0.8,
+            "top_k": 40,
+        }
+        return chat
+
+    def build_seed_history(self, persona_prompt, history, summary=""):
+        """Build chat contents: the persona (and summary) as an opening exchange, then prior turns oldest first"""
+        opening = persona_prompt
+        if summary:
+            opening += f"\n\nSummary of your earlier conversation with this user:\n{summary}"
+        seed = [
+            {"role": "user", "parts": [opening]},
+            {"role": "model", "parts": [PERSONA_ACKNOWLEDGEMENT]},
+        ]
+        for turn in history:
+            role = "model" if turn["role"] == "assistant" else "user"
+            seed.append({"role": role, "parts": [turn["content"]]})
+        return seed
+
+    def build_prompt(self, message, history):
+        """Format the conversation history and the new message into a single prompt"""
+        context = "\n".join([f"{h['role']}: {h['content']}" for h in history])
+        return f"{context}\nUser: {message}"
+
+    def chat_tokens(self, chat, content):
+        """Estimate the tokens a send will cost: the chat's history plus the new content"""
+        history_tokens = sum(estimate_tokens(part.text) for entry in chat.history for part in entry.parts)
+        return history_tokens + estimate_tokens(content)
+
+    def generate_response(self, chat, message, history):
+        """Generate response with error handling and key rotation (blocking; returns error text on failure)"""
+        # Format the conversation history
+        prompt = self.build_prompt(message, history)
+        tried_keys = set()
         last_error = None
+        category = None
         
-        while current_retry < max_retries:
+        try:
+            self.check_global_breaker()
+        except GenerationError as e:
+            return f"Error: {e.user_message}"
+        
+        for attempt in range(self.retry_policy.max_attempts):
+            try:
+                current_key = self.get_next_valid_key(self.chat_tokens(chat, prompt), self.retry_exclusions(tried_keys))
+            except GenerationError as e:
+                last_error, category = e, e.category
+                break
+            tried_keys.add(current_key)
+            
+            call_started = time.monotonic()
             try:
-                current_key = API_KEYS[self.current_key_index]
-                genai.configure(api_key=current_key)
-                self.model = genai.GenerativeModel('gemini-pro')
+                # Generate response on a model bound to the chosen key
+                chat.model = self.get_model(current_key)
+                response = chat.send_message(prompt, generation_config=getattr(chat, "generation_config", None))
                 
-                chat = self.model.start_chat(
-                    context=persona_prompt,
-                    generation_config={
-                        "temperature": temperature,
-                        "top_p": 0.8,
-                        "top_k": 40,
-                    }
-                )
+                # Record successful request
+                self.record_request(current_key, response.text, call_started)
+                self.global_breaker.record_success()
                 
-                self.record_request(current_key)
-                return chat
+                return response.text
             
             except Exception as e:
-                last_error = str(e)
-                self.record_error(current_key)
-                self.log_error(f"Error creating chat with key index {self.current_key_index}", e)
-                
-                try:
-                    current_key = self.get_next_valid_key()
-                    current_retry += 1
-                except Exception as e:
-                    raise Exception(f"All API keys failed: {str(e)}")
+                last_error = e
+                category = self.record_error(current_key, e, call_started)
+                if not self.retry_policy.should_retry(category, attempt):
+                    break
+                time.sleep(self.retry_policy.delay(attempt))
         
-        raise Exception(f"Failed to create chat session after {max_retries} attempts. Last error: {last_error}")
+        return f"Error: {self.fail_request(last_error, category, upstream=bool(tried_keys)).user_message}"
 
-    def generate_response(self, chat, message, history):
-        """Generate response with error handling and key rotation"""
-        max_retries = len(API_KEYS)
-        current_retry = 0
+    async def _send_message_async(self, chat, content):
+        """Send a message without blocking the event loop"""
+        generation_config = getattr(chat, "generation_config", None)
+        send_async = getattr(chat, "send_message_async", None)
+        if send_async is not None:
+            return await send_async(content, generation_config=generation_config)
+        
+        # Fall back to the bounded executor for SDKs without an async client
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            functools.partial(chat.send_message, content, generation_config=generation_config)
+        )
+
+    async def _send_with_retries_async(self, chat, content):
+        """Send content on the chat under the retry policy; raises GenerationError when it gives up"""
+        self.check_global_breaker()
+        tried_keys = set()
         last_error = None
+        category = None
         
-        while current_retry < max_retries:
+        async with self.generation_semaphore:
+            self.in_flight += 1
             try:
-                current_key = API_KEYS[self.current_key_index]
-                
-                # Format the conversation history
-                context = "\n".join([f"{h['role']}: {h['content']}" for h in history])
-                prompt = f"{context}\nUser: {message}"
-                
-                # Generate response
-                response = chat.send_message(prompt)
-                
-                # Record successful request
-                self.record_request(current_key)
-                
-                return response.text
-            
-            except Exception as e:
-                last_error = str(e)
-                self.record_error(current_key)
-                self.log_error(f"Error generating response with key index {self.current_key_index}", e)
+                for attempt in range(self.retry_policy.max_attempts):
+                    try:
+                        current_key = await self.acquire_key(
+                            self.chat_tokens(chat, content), self.retry_exclusions(tried_keys)
+                        )
+                    except GenerationError as e:
+                        last_error, category = e, e.category
+                        break
+                    tried_keys.add(current_key)
+                    
+                    call_started = time.monotonic()
+                    try:
+                        chat.model = self.get_model(current_key)
+                        response = await self._send_message_async(chat, content)
+                        
+                        await self.record_request_async(current_key, response.text, call_started)
+                        self.global_breaker.record_success()
+                        return response.text
+                    
+                    except Exception as e:
+                        last_error = e
+                        category = await self.record_error_async(current_key, e, call_started)
+                        self.log_error(f"Error generating response with key ending in ...{current_key[-4:]}", e)
+                        if not self.retry_policy.should_retry(category, attempt):
+                            break
+                        await self.retry_policy.sleep(attempt)
                 
-                try:
-                    current_key = self.get_next_valid_key()
-                    current_retry += 1
+                raise self.fail_request(last_error, category, upstream=bool(tried_keys))
+            finally:
+                self.in_flight -= 1
+
+    async def generate_response_async(self, chat, message, history):
+        """Generate response for a one-off chat without blocking the event loop"""
+        return await self._send_with_retries_async(chat, self.build_prompt(message, history))
+
+    def get_pooled_chat(self, session_key, persona_prompt, temperature, history, summary=""):
+        """Get the live chat for a conversation, seeding a new one with the summary and budgeted history"""
+        chat = self.session_pool.get(session_key, persona_prompt, temperature)
+        if chat is None:
+            chat = self.create_chat(persona_prompt, temperature, history, summary)
+            self.session_pool.put(session_key, chat)
+        return chat
+
+    def with_memories(self, message, memories):
+        """Message to send for this turn, with recalled long-term memories in front"""
+        return f"{memories}\n\nNew message:\n{message}" if memories else message
+
+    def forget_memories(self, chat, message, memories):
+        """Keep only the plain message in the live chat, so recalled memories are not resent every turn"""
+        if not memories:
+            return
+        _, received = chat.rewind()
+        chat.history = chat.history + [glm.Content(role="user", parts=[glm.Part(text=message)]), received]
+
+    async def generate_reply_async(self, session_key, persona_prompt, temperature, message, history, summary="",
+                                   memories=""):
+        """Generate a reply through the pooled chat for this conversation, sending only the new message"""
+        chat = self.get_pooled_chat(session_key, persona_prompt, temperature, history, summary)
+        response = await self._send_with_retries_async(chat, self.with_memories(message, memories))
+        self.forget_memories(chat, message, memories)
+        self.session_pool.trim(chat)
+        return response
+
+    async def _stream_with_retries_async(self, chat, content):
+        """Yield text chunks as they arrive, retrying only while nothing has been yielded yet"""
+        self.check_global_breaker()
+        tried_keys = set()
+        last_error = None
+        category = None
+        
+        async with self.generation_semaphore:
+            self.in_flight += 1
+            try:
+                for attempt in range(self.retry_policy.max_attempts):
+                    try:
+                        current_key = await self.acquire_key(
+                            self.chat_tokens(chat, content), self.retry_exclusions(tried_keys)
+                        )
+                    except GenerationError as e:
+                        last_error, category = e, e.category
+                        break
+                    tried_keys.add(current_key)
                     
-                    # Recreate chat session with new key
-                    chat = self.create_chat(chat.context, chat.generation_config["temperature"])
-                except Exception as e:
-                    return f"Error: All API keys failed. Please try again later. Details: {str(e)}"
+                    started = False
+                    streamed = []
+                    call_started = time.monotonic()
+                    try:
+                        chat.model = self.get_model(current_key)
+                        if getattr(chat, "send_message_async", None) is None:
+                            # No async client: generate in the executor and yield the whole reply
+                            response = await self._send_message_async(chat, content)
+                            started = True
+                            streamed.append(response.text)
+                            yield response.text
+                        else:
+                            response = await chat.send_message_async(
+                                content,
+                                generation_config=getattr(chat, "generation_config", None),
+                                stream=True
+                            )
+                            async for chunk in response:
+                                started = True
+                                streamed.append(chunk.text)
+                                yield chunk.text
+                        
+                        await self.record_request_async(current_key, "".join(streamed), call_started)
+                        self.global_breaker.record_success()
+                        return
+                    
+                    except Exception as e:
+                        last_error = e
+                        category = await self.record_error_async(current_key, e, call_started)
+                        self.log_error(f"Error streaming response with key ending in ...{current_key[-4:]}", e)
+                        
+                        if started:
+                            # Part of the reply is already shown; drop the broken exchange and give up
+                            chat.rewind()
+                            self.fail_request(e, category)
+                            raise GenerationError("The reply was interrupted. Please try again.", category) from e
+                        if not self.retry_policy.should_retry(category, attempt):
+                            break
+                        await self.retry_policy.sleep(attempt)
+                
+                raise self.fail_request(last_error, category, upstream=bool(tried_keys))
+            finally:
+                self.in_flight -= 1
+
+    async def stream_reply_async(self, session_key, persona_prompt, temperature, message, history, summary="",
+                                 memories=""):
+        """Stream a reply through the pooled chat for this conversation as text chunks"""
+        chat = self.get_pooled_chat(session_key, persona_prompt, temperature, history, summary)
+        async for chunk in self._stream_with_retries_async(chat, self.with_memories(message, memories)):
+            yield chunk
+        self.forget_memories(chat, message, memories)
+        self.session_pool.trim(chat)
+
+    async def summarize_async(self, previous_summary, turns, token_budget):
+        """Fold turns into the previous summary with a single low-temperature call"""
+        transcript = "\n".join(
+            f"User: {turn.message}\nAssistant: {turn.response}" for turn in turns
+        )
+        prompt = (
+            "Update the running summary of a conversation between a user and an assistant. "
+            f"Keep names, facts, preferences and open questions. Use at most {token_budget * 3 // 4} words.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"New turns:\n{transcript}\n\n"
+            "Updated summary:"
+        )
+        generation_config = {"temperature": 0.2, "max_output_tokens": token_budget}
         
-        return f"Error: Failed to generate response after {max_retries} attempts. Last error: {last_error}"
+        self.check_global_breaker()
+        async with self.generation_semaphore:
+            current_key = await self.acquire_key(estimate_tokens(prompt))
+            # Set before the try so the error path can always report the call's duration
+            call_started = time.monotonic()
+            try:
+                model = self.get_model(current_key)
+                response = await model.generate_content_async(prompt, generation_config=generation_config)
+                await self.record_request_async(current_key, response.text, call_started)
+                self.global_breaker.record_success()
+                return response.text.strip()
+            except Exception as e:
+                raise self.fail_request(e, await self.record_error_async(current_key, e, call_started)) from e
+
+    def export_key_health(self):
+        """Health and usage of every key, keyed by key_id(), for saving to the database"""
+        health = {}
+        for key in API_KEYS:
+            scheduler_health = self.key_scheduler.export_health(key)
+            for field in ("cooldown_until", "breaker_opened_at"):
+                if scheduler_health[field] is not None:
+                    scheduler_health[field] = datetime.utcfromtimestamp(scheduler_health[field])
+            health[key_id(key)] = {**self.key_status[key], **scheduler_health}
+            # Other workers save the same rows, so counters are saved as increments since the last save
+            for field in KEY_HEALTH_COUNTERS:
+                health[key_id(key)][field] -= self.saved_counts[key][field]
+        return health
+
+    def mark_key_health_saved(self, health):
+        """Note that the counter increments in `health`, from export_key_health, were written"""
+        for key in API_KEYS:
+            for field in KEY_HEALTH_COUNTERS:
+                self.saved_counts[key][field] += health[key_id(key)][field]
+
+    def restore_key_health(self, saved):
+        """Apply health saved by export_key_health; keys that were removed from the config are ignored"""
+        restored = 0
+        for key in API_KEYS:
+            health = saved.get(key_id(key))
+            if not health:
+                continue
+            status = self.key_status[key]
+            for field in ("errors", "last_error", "total_requests", "last_request"):
+                status[field] = health[field]
+            for field in KEY_HEALTH_COUNTERS:
+                self.saved_counts[key][field] = health[field]
+            # Wall-clock times survive the restart; the scheduler keeps monotonic ones
+            scheduler_health = dict(health)
+            for field in ("cooldown_until", "breaker_opened_at"):
+                if scheduler_health[field] is not None:
+                    scheduler_health[field] = (scheduler_health[field] - datetime(1970, 1, 1)).total_seconds()
+            self.key_scheduler.restore_health(key, scheduler_health)
+            self.reset_expired_errors(key)
+            restored += 1
+        self.log_info(f"Restored health for {restored} of {len(API_KEYS)} API keys")
+        return restored
+
+    def shutdown(self):
+        """Release the generation executor and the key scheduler"""
+        self.executor.shutdown(wait=False)
+        self.key_scheduler.close()
+        self.log_info("Generation executor shut down")
 
     def get_status(self):
         """Get the current status of all API keys"""
@@ -183,6 +625,11 @@ class AIHandler:
             "uptime": str(current_time - self.startup_time),
             "total_keys": len(API_KEYS),
             "current_key_index": self.current_key_index,
+            "in_flight": self.in_flight,
+            "max_concurrent": MAX_CONCURRENT_GENERATIONS,
+            "sessions": self.session_pool.stats(),
+            "circuit_breaker": self.global_breaker.stats(),
+            "fast_failures": self.fast_failures,
             "keys": {}
         }
         
@@ -193,7 +640,9 @@ class AIHandler:
                 "total_requests": key_info["total_requests"],
                 "last_error": str(key_info["last_error"]) if key_info["last_error"] else "Never",
                 "last_request": str(key_info["last_request"]) if key_info["last_request"] else "Never",
-                "status": "healthy" if key_info["errors"] < 5 else "cooling_down"
+                **self.daily_usage(key),
+                "status": "healthy" if self.key_scheduler.is_available(key) else "cooling_down",
+                **self.key_scheduler.stats(key)
             }
         
         return status
@@ -0,0 +1,109 @@
+"""Stand-ins for Discord objects and the Gemini model, used by the benchmarks."""
+import asyncio
+import itertools
+import google.ai.generativelanguage as glm
+from google.generativeai.types import generation_types
+from google.generativeai.generative_models import ChatSession
+
+_ids = itertools.count(10**17)
+
+def next_id():
+    """Snowflake-sized unique id"""
+    return next(_ids)
+
+class FakeUser:
+    def __init__(self, name, user_id=None, bot=False):
+        self.name = name
+        self.display_name = name
+        self.id = user_id or next_id()
+        self.bot = bot
+        self.mention = f"<@{self.id}>"
+
+class FakeGuild:
+    def __init__(self, guild_id=None):
+        self.id = guild_id or next_id()
+
+class FakeSentMessage:
+    """A message the bot posted; edits and deletes only record themselves"""
+    def __init__(self, channel, content):
+        self.channel = channel
+        self.content = content
+        self.id = next_id()
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+        self.channel.edits += 1
+
+    async def delete(self):
+        self.channel.deletes += 1
+
+class FakeChannel:
+    def __init__(self, guild, channel_id=None, send_latency=0.0):
+        self.guild = guild
+        self.id = channel_id or next_id()
+        self.mention = f"<#{self.id}>"
+        self.send_latency = send_latency
+        self.sent = 0
+        self.edits = 0
+        self.deletes = 0
+
+    async def send(self, content=None, **kwargs):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.sent += 1
+        return FakeSentMessage(self, content)
+
+class FakeMessage:
+    """Incoming message with the attributes the bot's message path reads"""
+    def __init__(self, content, author, channel, state=None):
+        self._state = state  # discord.py's ConnectionState, read by commands.Context
+        self.id = next_id()
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.mentions = []
+        self.attachments = []
+        self.type = None
+
+def _response(text):
+    return glm.GenerateContentResponse(candidates=[glm.Candidate(
+        content=glm.Content(role="model", parts=[glm.Part(text=text)]),
+        finish_reason=glm.Candidate.FinishReason.STOP
+    )])
+
+class StubGenerativeModel:
+    """Replaces genai.GenerativeModel: waits `latency` seconds per call and returns canned text"""
+    def __init__(self, latency=0.05, chunks=4, reply_words=60):
+        self.latency = latency
+        self.chunks = chunks
+        self.reply_words = reply_words
+        self.calls = 0
+
+    def start_chat(self, history=None):
+        return ChatSession(self, history)
+
+    def _reply(self):
+        return " ".join(["word"] * self.reply_words)
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        text = self._reply()
+        if not stream:
+            return generation_types.AsyncGenerateContentResponse.from_response(_response(text))
+
+        size = max(1, len(text) // self.chunks)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+
+        async def stream_chunks():
+            for piece in pieces:
+                # Spread part of the latency over the chunks, like a real stream
+                await asyncio.sleep(self.latency / len(pieces))
+                yield _response(piece)
+
+        return await generation_types.AsyncGenerateContentResponse.from_aiterator(stream_chunks())
+
+    def generate_content(self, contents, **kwargs):
+        self.calls += 1
+        return generation_types.GenerateContentResponse.from_response(_response(self._reply()))
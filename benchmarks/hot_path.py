@@ -0,0 +1,165 @@
+"""Drive the bot's on_message path with fake Discord messages and a stub Gemini model.
+
+Runs against a temporary SQLite database and reports throughput, latency percentiles and
+database queries per message. Run from the repository root:
+    python -m benchmarks.hot_path --users 20 --messages 10 --latency 0.05
+    python -m benchmarks.hot_path --save-baseline benchmarks/baseline.json
+    python -m benchmarks.hot_path --baseline benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Metrics where a larger value is better; every other metric is better when smaller
+HIGHER_IS_BETTER = {"messages_per_second"}
+
+def prepare_environment(directory):
+    """Point the bot at a throwaway database and persona, and lift limits that would throttle the stub"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    os.environ["PERSONA_FILE"] = os.path.join(directory, "prompt.txt")
+    os.environ.setdefault("DISCORD_TOKEN", "x" * 60)
+    os.environ.setdefault("GEMINI_API_KEYS", ",".join(f"benchmark-key-{i:020d}" for i in range(2)))
+    os.environ.setdefault("GEMINI_RPM_LIMIT", "1000000")
+    os.environ.setdefault("GEMINI_TPM_LIMIT", "1000000000")
+    os.environ.setdefault("MESSAGE_DEBOUNCE_SECONDS", "0")
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+async def run(args):
+    """Set the bot up like on_ready would, send the simulated traffic and collect metrics"""
+    # Imported here so config.py sees the benchmark environment
+    import bot as bot_module
+    from sqlalchemy import event
+    from models import init_db, async_engine
+    from benchmarks.fakes import FakeUser, FakeGuild, FakeChannel, FakeMessage, StubGenerativeModel
+
+    init_db()
+    stub = StubGenerativeModel(args.latency, args.chunks, args.reply_words)
+    ai = bot_module.ai
+    ai.models = {key: stub for key in ai.models}
+    ai.model = stub
+
+    bot_user = FakeUser("gembot", bot=True)
+    bot_module.bot._connection.user = bot_user
+    guild = FakeGuild()
+    channel = FakeChannel(guild, send_latency=args.send_latency)
+    await bot_module.on_ready()
+    await bot_module.db.set_channel(str(guild.id), str(channel.id))
+
+    # Count every statement sent to the database
+    queries = {"count": 0}
+
+    def count_query(*_):
+        queries["count"] += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_query)
+
+    # Resolve each message's future once the queued reply that covers it is done
+    pending = {}
+    respond = bot_module.conversation_queue.handler
+
+    async def timed_respond(batch):
+        try:
+            await respond(batch)
+        finally:
+            finished = time.perf_counter()
+            for message in batch:
+                future = pending.pop(message.id, None)
+                if future and not future.done():
+                    future.set_result(finished)
+
+    bot_module.conversation_queue.handler = timed_respond
+    latencies = []
+
+    async def user_session(number):
+        author = FakeUser(f"user{number}")
+        for turn in range(args.messages):
+            message = FakeMessage(
+                f"Hello there, this is message {turn} from user {number}!", author, channel,
+                state=bot_module.bot._connection
+            )
+            future = asyncio.get_running_loop().create_future()
+            pending[message.id] = future
+            arrival = time.perf_counter()
+            await bot_module.on_message(message)
+            latencies.append(await future - arrival)
+
+    try:
+        queries["count"] = 0
+        start = time.perf_counter()
+        await asyncio.gather(*(user_session(number) for number in range(args.users)))
+        elapsed = time.perf_counter() - start
+        query_count = queries["count"]
+    finally:
+        # The database pool keeps the process alive until it is disposed
+        await bot_module.lifecycle.shutdown()
+
+    total = len(latencies)
+    return {
+        "messages": total,
+        "messages_per_second": total / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "queries_per_message": query_count / total,
+        "model_calls_per_message": stub.calls / total,
+    }
+
+def compare(results, baseline, tolerance):
+    """Print the change against a baseline and return the metrics that regressed beyond tolerance"""
+    regressions = []
+    print(f"\n{'metric':<26}{'baseline':>12}{'current':>12}{'change':>10}")
+    for metric, value in results.items():
+        if metric == "messages" or metric not in baseline or not baseline[metric]:
+            continue
+        change = (value - baseline[metric]) / baseline[metric]
+        worse = -change if metric in HIGHER_IS_BETTER else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{metric:<26}{baseline[metric]:>12.2f}{value:>12.2f}{change * 100:>9.1f}%{flag}")
+        if flag:
+            regressions.append(metric)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--messages", type=int, default=10, help="messages sent by each user, one at a time")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub model latency per call, in seconds")
+    parser.add_argument("--chunks", type=int, default=4, help="chunks per streamed reply")
+    parser.add_argument("--reply-words", type=int, default=60)
+    parser.add_argument("--send-latency", type=float, default=0.0, help="fake Discord send latency, in seconds")
+    parser.add_argument("--baseline", help="compare against this baseline JSON file")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="gembot-bench-") as directory:
+        prepare_environment(directory)
+        results = asyncio.run(run(args))
+
+    print(f"\n{'metric':<26}{'value':>12}")
+    for metric, value in results.items():
+        print(f"{metric:<26}{value:>12.2f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print(f"\nRegressed beyond {args.tolerance * 100:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
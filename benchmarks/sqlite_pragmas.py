@@ -0,0 +1,79 @@
+"""Compare add_chat_history/get_chat_history throughput with and without the SQLite pragmas.
+
+Run from the repository root (needs the usual .env for config.py):
+    python -m benchmarks.sqlite_pragmas --users 50 --turns 20
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from models import Base, build_engine, create_async_db_engine
+from db_handler import AsyncDatabaseHandler
+
+async def run_profile(tuned, users, turns, concurrency):
+    """Time concurrent history writes, then uncached history reads, on a fresh database file"""
+    with tempfile.TemporaryDirectory(prefix="gembot-bench-") as directory:
+        url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        return await measure(url, tuned, users, turns, concurrency)
+
+async def measure(url, tuned, users, turns, concurrency):
+    """Run the write and read phases against the database at `url`"""
+    sync_engine = build_engine(url, tuned=tuned)
+    Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+
+    async_db_engine = create_async_db_engine(url, tuned=tuned)
+    db = AsyncDatabaseHandler(async_sessionmaker(async_db_engine, expire_on_commit=False), async_db_engine)
+    # Measure the database, not the in-memory history cache
+    db.history_cache.max_users = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def write(user, turn):
+        async with limit:
+            await db.add_chat_history(f"user{user}", f"message {turn}", f"response {turn} " * 20)
+
+    async def read(user):
+        async with limit:
+            await db.get_chat_history(f"user{user}")
+
+    try:
+        start = time.perf_counter()
+        for turn in range(turns):
+            await asyncio.gather(*(write(user, turn) for user in range(users)))
+        write_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(turns):
+            await asyncio.gather(*(read(user) for user in range(users)))
+        read_seconds = time.perf_counter() - start
+    finally:
+        await db.cleanup()
+
+    operations = users * turns
+    return {
+        "writes_per_second": operations / write_seconds,
+        "reads_per_second": operations / read_seconds,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    results = {}
+    for label, tuned in (("default", False), ("tuned", True)):
+        results[label] = asyncio.run(run_profile(tuned, args.users, args.turns, args.concurrency))
+
+    print(f"\n{'profile':<10}{'writes/s':>12}{'reads/s':>12}")
+    for label, result in results.items():
+        print(f"{label:<10}{result['writes_per_second']:>12.1f}{result['reads_per_second']:>12.1f}")
+    for metric in ("writes_per_second", "reads_per_second"):
+        speedup = results["tuned"][metric] / results["default"][metric]
+        print(f"{metric}: {speedup:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,28 @@
 import discord
 from discord.ext import commands
 import re
-from config import DISCORD_TOKEN, DEFAULT_TEMPERATURE, API_KEYS
-from db_handler import DatabaseHandler
+from config import (
+    DISCORD_TOKEN, DEFAULT_TEMPERATURE, API_KEYS, MAX_HISTORY_LENGTH, HISTORY_STORED_TURNS, STREAM_RESPONSES,
+    BOT_SHARDING, SHARD_COUNT, SHARD_IDS, HOT_CACHE_REFRESH_INTERVAL, KEY_HEALTH_FLUSH_INTERVAL,
+    MEMORY_ENABLED, MEMORY_DIR, PROMPT_TOKEN_BUDGET
+)
+from db_handler import AsyncDatabaseHandler
+from models import init_db, engine, async_engine
 from ai_handler import AIHandler
+from prompt_builder import PromptBuilder, ConversationSummarizer, format_turns
+from message_utils import StreamingReply, NoticeThrottle, split_message
+from resilience import GenerationError, FATAL
+from conversation_queue import ConversationQueue
+from response_cache import ResponseCache
+from persona import PersonaManager
+from memory import LongTermMemory, format_memories
+from channel_context import ChannelContext, build_channel_turns, format_speaker_lines
+from lifecycle import LifecycleManager
+import metrics
+import asyncio
+import time
 import os
+from collections import Counter
 from datetime import datetime
 
 # Bot setup
@@ -12,9 +30,85 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix=['!', '/'], intents=intents)
-db = DatabaseHandler()
+# Workers started by launcher.py run a fixed set of shards; 'auto' lets one process run them all
+SHARDED = bool(SHARD_IDS) or BOT_SHARDING == 'auto'
+
+def shard_options():
+    """Keyword arguments selecting this process's shards"""
+    if SHARD_IDS:
+        return {"shard_ids": SHARD_IDS, "shard_count": SHARD_COUNT}
+    if BOT_SHARDING == 'auto':
+        return {"shard_count": SHARD_COUNT or None}
+    return {}
+
+class PersonaBot(commands.AutoShardedBot if SHARDED else commands.Bot):
+    """Bot that writes out buffered state before disconnecting"""
+    key_health_task = None
+
+    async def setup_hook(self):
+        # Restore key cooldowns, breakers and quota usage before the first message is handled
+        await ai.key_scheduler.run(ai.restore_key_health, await db.load_key_health())
+        self.key_health_task = asyncio.create_task(self.save_key_health_loop())
+
+    async def save_key_health_loop(self):
+        """Save key health every KEY_HEALTH_FLUSH_INTERVAL seconds"""
+        while True:
+            await asyncio.sleep(KEY_HEALTH_FLUSH_INTERVAL)
+            await self.save_key_health()
+
+    async def save_key_health(self):
+        """Save key health; counter increments are marked saved only once they are written"""
+        health = ai.export_key_health()
+        if await db.save_key_health(health):
+            ai.mark_key_health_saved(health)
+
+    async def stop_saving_key_health(self):
+        """Stop the periodic save and save key health one last time"""
+        if self.key_health_task:
+            self.key_health_task.cancel()
+            self.key_health_task = None
+            await self.save_key_health()
+
+    async def close(self):
+        # Replies still in flight need the gateway connection, so drain before disconnecting
+        await lifecycle.shutdown()
+        await super().close()
+
+bot = PersonaBot(command_prefix=['!', '/'], intents=intents, **shard_options())
+db = AsyncDatabaseHandler()
 ai = AIHandler()
+prompt_builder = PromptBuilder()
+summarizer = ConversationSummarizer(ai, db)
+response_cache = ResponseCache(db)
+
+# Recent messages of channel-mode channels, for shared conversation context
+channel_context = ChannelContext(db)
+
+# Persona prompt held in memory; live chats built from an old persona are dropped on reload
+persona_manager = PersonaManager(on_reload=ai.session_pool.clear)
+
+# Per-stage counters of how incoming messages were handled or dropped
+message_stats = Counter()
+
+# Vector index of past turns; each worker process keeps its own so they never write the same files
+long_term_memory = LongTermMemory(
+    os.path.join(MEMORY_DIR, "shards-" + "-".join(map(str, SHARD_IDS))) if SHARD_IDS else MEMORY_DIR
+)
+
+# Keeps error notices from flooding a channel during an outage
+notice_throttle = NoticeThrottle()
+
+# Receive time of messages waiting in the conversation queue, for reply latency
+received_at = {}
+
+# Stops new work on SIGTERM/SIGINT, drains replies and flushes state; steps are added below
+lifecycle = LifecycleManager()
+
+# Optional Prometheus endpoint; statements are timed on the async engine
+metrics_server = metrics.MetricsServer()
+metrics.instrument_engine(async_engine.sync_engine)
+# Precompiled matcher for the bot's name and mentions, built in on_ready
+bot_name_matcher = None
 
 # Bot Information Text
 BOT_INFO = f"""
@@ -37,26 +131,68 @@ This bot is designed to roleplay as an anime character using Google's Gemini AI.
 • !blacklist @user - Block user from using bot
 • !whitelist @user - Allow user to use bot
 • !keystatus - Check API keys status
+• !reloadpersona - Reload prompt.txt
+• !setpersona <prompt> - Custom persona for this server
+• !clearpersona - Use prompt.txt again in this server
+• !cache <on|off|default|clear> - Response cache for this channel
+• !context <user|channel|default> - Per-user or shared channel context
+• !stats - Show message filter and cache statistics
 
 Created by: {os.getenv('USER', 'aptdnfapt')}
 Last Updated: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC
 """
 
-def load_persona_prompt():
-    """Load the persona prompt from prompt.txt file"""
-    try:
-        with open('prompt.txt', 'r', encoding='utf-8') as file:
-            return file.read().strip()
-    except FileNotFoundError:
-        print("Warning: prompt.txt not found! Creating with default prompt...")
-        default_prompt = """You are a friendly anime character. Your responses should be:
-1. In character and consistent
-2. Family-friendly and appropriate
-3. Engaging and interactive
-4. Written in a natural conversational style"""
-        with open('prompt.txt', 'w', encoding='utf-8') as file:
-            file.write(default_prompt)
-        return default_prompt
+def build_name_matcher(user):
+    """Compile a case-insensitive matcher for the bot's name and its <@id> mentions"""
+    return re.compile(rf"{re.escape(user.name)}|<@!?{user.id}>", re.IGNORECASE)
+
+def is_addressed_to_bot(message, channel_id):
+    """Check whether a message is in the bot's channel or mentions the bot, without any I/O"""
+    global bot_name_matcher
+    if channel_id and str(message.channel.id) == channel_id:
+        return True
+    if bot_name_matcher is None:
+        bot_name_matcher = build_name_matcher(bot.user)
+    return bot_name_matcher.search(message.content) is not None
+
+async def build_reply_context(guild_id, user_id, content):
+    """Get the persona, summary, budgeted history and recalled memories for a reply; queue overflow turns for summarizing"""
+    # Get every stored turn (newest first) and the summary of older turns
+    history = await db.get_chat_history(user_id, HISTORY_STORED_TURNS)
+    summary = await db.get_summary(user_id)
+    
+    # Persona for this guild, from memory
+    persona_prompt = persona_manager.get(guild_id)
+    
+    # Fit unsummarized turns into the token budget; turns past the budget or the history window are due
+    # to be folded into the summary, and stay in the prompt while they fit until that happens
+    turns = summarizer.unsummarized(user_id, list(reversed(history)), summary)
+    kept, overflow = prompt_builder.fit_history(persona_prompt + summary.summary + content, turns)
+    summarizer.fold(user_id, turns[:max(len(overflow), len(turns) - MAX_HISTORY_LENGTH)])
+    
+    # Relevant turns older than those in the prompt, from the long-term memory index
+    memories = format_memories(long_term_memory.recall(user_id, content, exclude_recent=len(kept)))
+    
+    return persona_prompt, format_turns(kept), summary.summary, memories
+
+async def build_channel_context(guild_id, channel_id, user_id, messages):
+    """Get the persona, the channel's recent messages as seed turns, the message to send and recalled memories"""
+    message = messages[-1]
+    author_name = message.author.display_name
+    content = "\n".join(queued.content for queued in messages)
+    persona_prompt = persona_manager.get(guild_id)
+    memories = format_memories(long_term_memory.recall(user_id, content, exclude_recent=MAX_HISTORY_LENGTH))
+    
+    window = await channel_context.window(channel_id)
+    turns, unanswered = build_channel_turns(window, persona_prompt + memories + content, PROMPT_TOKEN_BUDGET)
+    # Everything said since the bot last spoke goes into this turn; the batch itself is missing from the
+    # window only when the channel was switched to channel mode after it arrived
+    lines = format_speaker_lines(unanswered)
+    batch_ids = {str(queued.id) for queued in messages}
+    if not any(entry.message_id in batch_ids for entry in unanswered):
+        lines = "\n".join(filter(None, [lines, f"{author_name}: {content}"]))
+    
+    return persona_prompt, turns, f"{lines}\n\n(Reply to {author_name}.)", memories
 
 @bot.event
 async def on_ready():
@@ -67,10 +203,57 @@ async def on_ready():
     print(f'Started at: {datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")} UTC')
     print('------')
     
+    global bot_name_matcher
+    bot_name_matcher = build_name_matcher(bot.user)
+    
     # Initialize settings if not exist
-    settings = db.get_settings()
+    settings = await db.get_settings()
     if not settings.temperature:
-        db.update_temperature(DEFAULT_TEMPERATURE)
+        await db.update_temperature(DEFAULT_TEMPERATURE)
+    
+    # Keep settings, channels and the blacklist in memory for the message path
+    await db.load_hot_cache()
+    
+    # Start batched history trimming and write-behind flushing if configured
+    db.start_compaction()
+    db.start_flusher()
+    channel_context.start_flushing()
+    # Pick up settings and blacklist changes made through other worker processes
+    db.start_hot_cache_refresh(HOT_CACHE_REFRESH_INTERVAL)
+    
+    # Serve /metrics if METRICS_PORT is set
+    await metrics_server.start()
+    
+    # Open the long-term memory index, filling a new one from stored history and catching up on turns
+    # stored after its last flush (lost if the bot stopped before flushing)
+    if MEMORY_ENABLED and not long_term_memory.is_open:
+        long_term_memory.open()
+        if long_term_memory.count == 0:
+            await backfill_memory()
+        elif long_term_memory.until is not None:
+            await backfill_memory(since=long_term_memory.until)
+        long_term_memory.start_flushing()
+    
+    # Load the persona and guild overrides, then watch prompt.txt for edits
+    persona_manager.load()
+    persona_manager.set_overrides(await db.get_guild_personas())
+    persona_manager.start_watching()
+
+async def backfill_memory(batch_size=1000, since=None):
+    """Embed the turns in the database (newer than `since`, if given) into the long-term memory index"""
+    after_id = 0
+    added = 0
+    while True:
+        rows = await db.get_chat_history_page(after_id, batch_size, since)
+        if not rows:
+            break
+        for row in rows:
+            long_term_memory.add(row.user_id, row.message, row.response, row.timestamp)
+        added += len(rows)
+        after_id = rows[-1].id
+    await asyncio.to_thread(long_term_memory.flush)
+    if added:
+        print(f"Long-term memory backfilled with {added} turns ({long_term_memory.count} in total)")
 
 @bot.command(name='info')
 async def show_info(ctx):
@@ -81,7 +264,7 @@ async def show_info(ctx):
 @commands.has_permissions(administrator=True)
 async def set_channel(ctx):
     """Set the current channel as the bot's primary chat channel"""
-    db.set_channel(str(ctx.guild.id), str(ctx.channel.id))
+    await db.set_channel(str(ctx.guild.id), str(ctx.channel.id))
     await ctx.send(f'✅ Set {ctx.channel.mention} as the primary chat channel!')
 
 @bot.command(name='settemp')
@@ -91,7 +274,7 @@ async def set_temperature(ctx, temp: float):
     try:
         temp = float(temp)
         if 0.0 <= temp <= 1.0:
-            db.update_temperature(temp)
+            await db.update_temperature(temp)
             await ctx.send(f'✅ Temperature set to {temp}')
         else:
             await ctx.send('❌ Temperature must be between 0.0 and 1.0')
@@ -110,16 +293,80 @@ async def blacklist_user(ctx, user: discord.Member):
         await ctx.send("❌ You cannot blacklist yourself!")
         return
     
-    db.set_user_access(str(user.id), True, str(ctx.author.id))
+    await db.set_user_access(str(user.id), True, str(ctx.author.id))
     await ctx.send(f"✅ User {user.mention} has been blacklisted from using the bot.")
 
 @bot.command(name='whitelist')
 @commands.has_permissions(administrator=True)
 async def whitelist_user(ctx, user: discord.Member):
     """Remove a user from the blacklist"""
-    db.set_user_access(str(user.id), False, str(ctx.author.id))
+    await db.set_user_access(str(user.id), False, str(ctx.author.id))
     await ctx.send(f"✅ User {user.mention} has been whitelisted and can now use the bot.")
 
+@bot.command(name='reloadpersona')
+@commands.has_permissions(administrator=True)
+async def reload_persona(ctx):
+    """Reload the persona from prompt.txt and reset live chat sessions"""
+    persona_manager.reload()
+    persona_manager.set_overrides(await db.get_guild_personas())
+    await ctx.send('✅ Persona reloaded')
+
+@bot.command(name='setpersona')
+@commands.has_permissions(administrator=True)
+async def set_guild_persona(ctx, *, prompt: str):
+    """Use a custom persona in this server instead of prompt.txt"""
+    await db.set_guild_persona(str(ctx.guild.id), prompt.strip(), str(ctx.author.id))
+    persona_manager.set_override(str(ctx.guild.id), prompt.strip())
+    await ctx.send('✅ Persona set for this server')
+
+@bot.command(name='clearpersona')
+@commands.has_permissions(administrator=True)
+async def clear_guild_persona(ctx):
+    """Go back to the prompt.txt persona in this server"""
+    await db.set_guild_persona(str(ctx.guild.id), None, str(ctx.author.id))
+    persona_manager.set_override(str(ctx.guild.id), None)
+    await ctx.send('✅ Persona override removed for this server')
+
+@bot.command(name='cache')
+@commands.has_permissions(administrator=True)
+async def set_response_cache(ctx, mode: str):
+    """Turn the response cache on or off for this channel, restore the default, or clear it"""
+    mode = mode.lower()
+    if mode == 'clear':
+        await response_cache.clear()
+        await ctx.send('✅ Response cache cleared')
+        return
+    
+    settings = {'on': True, 'off': False, 'default': None}
+    if mode not in settings:
+        await ctx.send('❌ Usage: !cache <on|off|default|clear>')
+        return
+    
+    await db.set_response_cache(str(ctx.guild.id), str(ctx.channel.id), settings[mode])
+    state = 'enabled' if response_cache.enabled_for(str(ctx.channel.id)) else 'disabled'
+    await ctx.send(f'✅ Response cache {state} for {ctx.channel.mention}')
+
+@bot.command(name='context')
+@commands.has_permissions(administrator=True)
+async def set_context_mode(ctx, mode: str):
+    """Use per-user or shared channel context in this channel, or restore the default"""
+    modes = {'user': 'user', 'channel': 'channel', 'default': None}
+    mode = mode.lower()
+    if mode not in modes:
+        await ctx.send('❌ Usage: !context <user|channel|default>')
+        return
+    
+    channel_id = str(ctx.channel.id)
+    await db.set_context_mode(str(ctx.guild.id), channel_id, modes[mode])
+    # Live chats were built for the old mode; the window is reloaded from what was stored
+    channel_context.forget(channel_id)
+    for session_key in [key for key in ai.session_pool.sessions if key[1] == channel_id]:
+        ai.session_pool.discard(session_key)
+    
+    dedicated = db.hot_cache.get_channel(str(ctx.guild.id))
+    state = 'channel' if channel_context.enabled_for(channel_id, dedicated) else 'per-user'
+    await ctx.send(f'✅ {ctx.channel.mention} now uses {state} context')
+
 @bot.command(name='keystatus')
 @commands.has_permissions(administrator=True)
 async def show_key_status(ctx):
@@ -131,65 +378,299 @@ async def show_key_status(ctx):
         last_error = ai.key_status[key]["last_error"]
         last_error_str = last_error.strftime("%Y-%m-%d %H:%M:%S") if last_error else "Never"
         
+        usage = ai.key_scheduler.stats(key)
+        daily = ai.daily_usage(key)
+        
         status_message += f"Key {i}:\n"
         status_message += f"- Masked Key: {masked_key}\n"
         status_message += f"- Errors: {errors}\n"
-        status_message += f"- Last Error: {last_error_str}\n\n"
+        status_message += f"- Last Error: {last_error_str}\n"
+        status_message += f"- Last Minute: {usage['requests_last_minute']} requests, {usage['tokens_last_minute']} tokens\n"
+        status_message += f"- Today (UTC): {daily['daily_requests']} requests, {daily['daily_tokens']} tokens\n"
+        status_message += f"- Headroom: {usage['headroom']}, Cooldown: {usage['cooldown_remaining']}\n"
+        status_message += f"- Breaker: {usage['breaker']}\n\n"
+    
+    breaker = ai.global_breaker.stats()
+    status_message += f"Global breaker: {breaker['state']} (retry in {breaker['retry_in']})\n"
+    
+    await ctx.send(status_message)
+
+@bot.command(name='stats')
+@commands.has_permissions(administrator=True)
+async def show_stats(ctx):
+    """Show message filter counters and cache statistics"""
+    status_message = "**Message Handling**\n"
+    for stage, count in sorted(message_stats.items()):
+        status_message += f"- {stage}: {count}\n"
+    
+    history_stats = {**db.history_cache.stats(), **db.write_stats()}
+    status_message += "\n**History Cache**\n"
+    for key, value in history_stats.items():
+        status_message += f"- {key}: {value}\n"
+    
+    status_message += f"\n**Generation**\n- in_flight: {ai.in_flight}\n"
+    for key, value in ai.session_pool.stats().items():
+        status_message += f"- {key}: {value}\n"
+    for key, value in summarizer.stats().items():
+        status_message += f"- summary_{key}: {value}\n"
+    status_message += f"- breaker_state: {ai.global_breaker.state}\n"
+    status_message += f"- fast_failures: {ai.fast_failures}\n"
+    status_message += f"- suppressed_notices: {notice_throttle.suppressed}\n"
+    
+    status_message += "\n**Persona**\n"
+    for key, value in persona_manager.stats().items():
+        status_message += f"- {key}: {value}\n"
+    
+    status_message += "\n**Response Cache**\n"
+    for key, value in response_cache.stats().items():
+        status_message += f"- {key}: {value}\n"
     
+    status_message += "\n**Channel Context**\n"
+    for key, value in channel_context.stats().items():
+        status_message += f"- {key}: {value}\n"
+    
+    status_message += "\n**Long-Term Memory**\n"
+    for key, value in long_term_memory.stats().items():
+        status_message += f"- {key}: {value}\n"
+    
+    status_message += "\n**Message Queue**\n"
+    for key, value in conversation_queue.stats().items():
+        status_message += f"- {key}: {value}\n"
     await ctx.send(status_message)
 
 @bot.event
 async def on_message(message):
     """Handle incoming messages"""
+    # Take no new work once shutdown has started
+    if not lifecycle.accepting:
+        message_stats["ignored_shutting_down"] += 1
+        return
+    
     # Ignore messages from the bot itself
     if message.author == bot.user:
+        message_stats["ignored_self"] += 1
         return
 
-    # Process commands first
-    await bot.process_commands(message)
+    # Process commands first; commands are not chat messages for the AI
+    if not message.author.bot:
+        ctx = await bot.get_context(message)
+        if ctx.valid:
+            message_stats["command"] += 1
+            await bot.invoke(ctx)
+            return
     
-    # Check if user is blacklisted
-    if db.is_user_blacklisted(str(message.author.id)):
+    if message.guild is None:
+        message_stats["ignored_direct_message"] += 1
         return
     
-    settings = db.get_settings()
-    channel_id = db.get_channel(str(message.guild.id))
+    # Messages can arrive before on_ready has finished loading the cache
+    await db.ensure_hot_cache()
+    
+    channel_id = db.hot_cache.get_channel(str(message.guild.id))
+    
+    # Channel-mode channels keep every message for context, not only those addressed to the bot;
+    # other bots are named speakers, only this bot's replies (recorded in respond) are its own turns
+    if (channel_context.enabled_for(str(message.channel.id), channel_id)
+            and not db.hot_cache.is_blacklisted(str(message.author.id))):
+        channel_context.record(
+            str(message.channel.id), str(message.author.id), message.author.display_name,
+            message.content, message.author.id == bot.user.id, str(message.id)
+        )
     
     # Check if message is in the designated channel or mentions the bot
-    bot_name = bot.user.name.lower()
-    if (channel_id and str(message.channel.id) == channel_id) or \
-       (bot_name in message.content.lower()):
-        try:
-            # Get chat history
-            history = db.get_chat_history(str(message.author.id))
-            history_formatted = [
-                {"role": "user" if i % 2 == 0 else "assistant",
-                 "content": h.message if i % 2 == 0 else h.response}
-                for i, h in enumerate(reversed(history))
-            ]
-            
-            # Load persona prompt from file
-            persona_prompt = load_persona_prompt()
-            
-            # Create chat instance with current settings
-            chat = ai.create_chat(
-                persona_prompt,
-                settings.temperature or DEFAULT_TEMPERATURE
+    if not is_addressed_to_bot(message, channel_id):
+        message_stats["ignored_not_addressed"] += 1
+        return
+    
+    # Check if user is blacklisted (memory lookup; kept in sync by the admin commands)
+    if db.hot_cache.is_blacklisted(str(message.author.id)):
+        message_stats["ignored_blacklisted"] += 1
+        return
+    
+    message_stats["accepted"] += 1
+    received_at[message.id] = time.monotonic()
+    # Answer one message at a time per user and channel; quick follow-ups are answered together
+    conversation_queue.submit((str(message.author.id), str(message.channel.id)), message)
+
+def check_reply_text(response, session_key):
+    """Reject an empty reply (a safety stop or empty completion) so it is neither shown nor stored"""
+    if response.strip():
+        return
+    # The live chat now ends with an empty exchange; reseed it next time
+    ai.session_pool.discard(session_key)
+    message_stats["empty_reply"] += 1
+    raise GenerationError("I couldn't come up with a reply to that. Please try rephrasing it.", FATAL)
+
+async def respond(messages):
+    """Generate and send one reply to a batch of queued messages from the same user and channel"""
+    message = messages[-1]
+    content = "\n".join(queued.content for queued in messages)
+    if len(messages) > 1:
+        message_stats["coalesced"] += len(messages) - 1
+    temperature = db.hot_cache.temperature or DEFAULT_TEMPERATURE
+    user_id = str(message.author.id)
+    session_key = (user_id, str(message.channel.id))
+    channel_mode = channel_context.enabled_for(
+        str(message.channel.id), db.hot_cache.get_channel(str(message.guild.id))
+    )
+    reply = None
+    outcome = "failed"
+    try:
+        # Repeated greetings and questions can be answered from the response cache
+        cache_key = None
+        # Replies in channel mode depend on what others said, so they are never cached
+        if not channel_mode and response_cache.enabled_for(str(message.channel.id)):
+            # Only the 'bucket' history mode keys on conversation length; skip the lookup otherwise
+            history_length = 0
+            if response_cache.history_mode == "bucket":
+                history_length = len(await db.get_chat_history(user_id))
+            cache_key = response_cache.make_key(
+                persona_manager.get(str(message.guild.id)), temperature, content, history_length
+            )
+        cached = await response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            message_stats["cache_hit"] += 1
+            for part in split_message(cached):
+                await message.channel.send(part)
+            # The live chat does not know about this exchange; it is reseeded from history next time
+            ai.session_pool.discard(session_key)
+            timestamp = await db.add_chat_history(user_id, content, cached)
+            long_term_memory.add(user_id, content, cached, timestamp)
+            outcome = "cached"
+            return
+        
+        if channel_mode:
+            persona_prompt, history_formatted, prompt_message, memories = await build_channel_context(
+                str(message.guild.id), str(message.channel.id), user_id, messages
+            )
+            summary = ""
+            # The live chat only knows this user's turns; reseed it from the channel window every time
+            ai.session_pool.discard(session_key)
+        else:
+            persona_prompt, history_formatted, summary, memories = await build_reply_context(
+                str(message.guild.id), user_id, content
             )
-            
-            # Generate response
-            response = ai.generate_response(chat, message.content, history_formatted)
-            
-            # Store in database
-            db.add_chat_history(str(message.author.id), message.content, response)
-            
-            # Send response
-            await message.channel.send(response)
-            
-        except Exception as e:
-            error_message = f"❌ An error occurred: {str(e)}"
-            print(error_message)
+            prompt_message = content
+        reply_args = (
+            session_key,
+            persona_prompt,
+            temperature,
+            prompt_message,
+            history_formatted,
+            summary,
+            memories
+        )
+        
+        if STREAM_RESPONSES:
+            # Show the reply as it is generated, editing at a rate-limited interval
+            reply = StreamingReply(message.channel)
+            await reply.start()
+            async for chunk in ai.stream_reply_async(*reply_args):
+                await reply.append(chunk)
+            response = reply.text
+            check_reply_text(response, session_key)
+            await reply.finish()
+        else:
+            # Reuse this conversation's live chat session; only the new message is sent
+            response = await ai.generate_reply_async(*reply_args)
+            check_reply_text(response, session_key)
+            for part in split_message(response):
+                await message.channel.send(part)
+        
+        # Store in database
+        timestamp = await db.add_chat_history(user_id, content, response)
+        long_term_memory.add(user_id, content, response, timestamp)
+        if channel_mode:
+            channel_context.record(str(message.channel.id), str(bot.user.id), bot.user.display_name, response, True)
+        if cache_key:
+            await response_cache.put(cache_key, response)
+        outcome = "replied"
+        
+    except GenerationError as e:
+        # Failed replies are not stored; notices are throttled per channel
+        message_stats["generation_failed"] += 1
+        print(f"Generation failed ({e.category}): {e.user_message}")
+        notice = f"❌ {e.user_message}" if notice_throttle.allow(message.channel.id) else None
+        if reply is not None:
+            await reply.abort(notice)
+        elif notice:
+            await message.channel.send(notice)
+        
+    except Exception as e:
+        error_message = f"❌ An error occurred: {str(e)}"
+        print(error_message)
+        if reply is not None:
+            await reply.abort(error_message if notice_throttle.allow(message.channel.id) else None)
+        elif notice_throttle.allow(message.channel.id):
             await message.channel.send(error_message)
+    
+    finally:
+        # Latency is measured from the oldest message the reply covers
+        started = min(received_at.pop(queued.id, time.monotonic()) for queued in messages)
+        metrics.REPLY_SECONDS.observe(time.monotonic() - started, outcome=outcome)
+
+# Serializes replies per user and channel
+conversation_queue = ConversationQueue(respond)
+
+async def drain_replies(timeout):
+    """Answer queued and in-flight messages within timeout seconds"""
+    dropped = await conversation_queue.drain(timeout)
+    if dropped:
+        print(f"Dropped {dropped} queued messages at shutdown")
+
+# Shutdown order: finish replies and summaries, write out buffered state, then release connections
+lifecycle.add_drain("replies", drain_replies)
+lifecycle.add_drain("summaries", summarizer.drain)
+lifecycle.add_step("key health", bot.stop_saving_key_health)
+lifecycle.add_step("persona watcher", persona_manager.stop_watching)
+lifecycle.add_step("metrics server", metrics_server.stop)
+lifecycle.add_step("long-term memory", long_term_memory.close)
+lifecycle.add_step("channel context", channel_context.stop_flushing)
+# Flushes write-behind history, stops compaction and disposes the async engine
+lifecycle.add_step("database", db.cleanup)
+lifecycle.add_step("sync engine", engine.dispose)
+lifecycle.add_step("generation executor", ai.shutdown)
+
+# Gauges read at scrape time
+metrics.REGISTRY.gauge(
+    "gembot_messages_total", "Incoming messages by how they were handled",
+    lambda: {(stage,): count for stage, count in message_stats.items()}, ("stage",), kind="counter"
+)
+metrics.REGISTRY.gauge("gembot_generations_in_flight", "Gemini generations in progress", lambda: ai.in_flight)
+metrics.REGISTRY.gauge(
+    "gembot_queued_messages", "Messages waiting in conversation queues",
+    lambda: conversation_queue.stats()["queued_messages"]
+)
+metrics.REGISTRY.gauge(
+    "gembot_active_conversations", "Conversations with a queue worker", lambda: len(conversation_queue.workers)
+)
+metrics.REGISTRY.gauge(
+    "gembot_key_headroom_ratio", "Share of a key's per-minute rate limits still available",
+    lambda: {(metrics.key_label(key),): ai.key_scheduler.headroom(key) for key in API_KEYS}, ("key",)
+)
+metrics.REGISTRY.gauge(
+    "gembot_key_breaker_open", "1 while a key's circuit breaker is open or half-open",
+    lambda: {
+        (metrics.key_label(key),): int(ai.key_scheduler.states[key].breaker.state != "closed") for key in API_KEYS
+    },
+    ("key",)
+)
+metrics.REGISTRY.gauge(
+    "gembot_global_breaker_open", "1 while the global Gemini circuit breaker is open or half-open",
+    lambda: int(ai.global_breaker.state != "closed")
+)
+metrics.REGISTRY.gauge(
+    "gembot_memory_turns", "Turns in the long-term memory index",
+    lambda: long_term_memory.count
+)
+metrics.REGISTRY.gauge(
+    "gembot_history_write_buffer_rows", "Chat history rows waiting to be flushed",
+    lambda: db.write_stats()["buffered_rows"]
+)
+metrics.REGISTRY.gauge(
+    "gembot_history_rows_dropped_total", "Chat history rows dropped because the write buffer was full",
+    lambda: db.rows_dropped, kind="counter"
+)
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -204,12 +685,31 @@ async def on_command_error(ctx, error):
         print(f"Error: {error}")
         await ctx.send(f"❌ An error occurred: {str(error)}")
 
-# Run the bot
-if __name__ == "__main__":
+async def run_bot():
+    """Run the bot until it is closed; SIGTERM and SIGINT close it gracefully"""
+    async with bot:
+        lifecycle.install_signal_handlers(bot.close)
+        await bot.start(DISCORD_TOKEN)
+
+def main():
+    """Create or migrate the database and run the bot until it disconnects"""
     try:
         print("Starting bot...")
         print(f"Current time (UTC): {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"Running as: {os.getenv('USER', 'aptdnfapt')}")
-        bot.run(DISCORD_TOKEN)
+        if SHARDED:
+            print(f"Shards: {SHARD_IDS or 'all'} of {SHARD_COUNT or 'recommended'}")
+        # Create missing tables and apply pending schema migrations; launcher.py workers (SHARD_IDS set)
+        # were already migrated by the launcher
+        if not SHARD_IDS:
+            init_db()
+        # bot.run() would set up discord.py's logging and handle signals itself
+        discord.utils.setup_logging()
+        asyncio.run(run_bot())
     except Exception as e:
         print(f"Failed to start bot: {str(e)}")
+        raise
+
+# Run the bot
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+from collections import OrderedDict, deque, namedtuple
+from config import MAX_HISTORY_LENGTH, HISTORY_STORED_TURNS, HISTORY_CACHE_MAX_USERS
+
+# Lightweight, session-independent copy of a ChatHistory row
+HistoryEntry = namedtuple("HistoryEntry", ["user_id", "message", "response", "timestamp"])
+
+# One message seen in a channel-mode channel; message_id is None for the bot's own replies
+ChannelMessageEntry = namedtuple(
+    "ChannelMessageEntry",
+    ["channel_id", "message_id", "author_id", "author_name", "content", "is_self", "timestamp"]
+)
+
+# Rolling conversation summary; summarized_until is None when nothing has been folded yet
+SummaryEntry = namedtuple("SummaryEntry", ["summary", "summarized_until"])
+
+class LRUCache:
+    """Size-bounded mapping that evicts the least recently used key"""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value, or None on a miss"""
+        value = self.items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+    def pop(self, key):
+        return self.items.pop(key, None)
+
+    def clear(self):
+        self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
+
+class HistoryCache:
+    """Write-through LRU cache holding a ring buffer of recent turns per user"""
+    def __init__(self, max_users=HISTORY_CACHE_MAX_USERS, turns_per_user=HISTORY_STORED_TURNS):
+        self.max_users = max_users
+        self.turns_per_user = turns_per_user
+        self.users = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_users > 0
+
+    def get(self, user_id, limit=MAX_HISTORY_LENGTH):
+        """Return up to `limit` cached turns (newest first), or None on a miss"""
+        buffer = self.users.get(user_id)
+        if buffer is None or limit > self.turns_per_user:
+            self.misses += 1
+            return None
+        
+        self.users.move_to_end(user_id)
+        self.hits += 1
+        entries = list(reversed(buffer))
+        return entries[:limit]
+
+    def load(self, user_id, entries):
+        """Populate a user's buffer from rows read from the database (newest first)"""
+        if not self.enabled:
+            return
+        
+        buffer = deque(maxlen=self.turns_per_user)
+        for entry in reversed(entries[:self.turns_per_user]):
+            buffer.append(entry)
+        self.users[user_id] = buffer
+        self.users.move_to_end(user_id)
+        self._evict()
+
+    def append(self, user_id, entry):
+        """Record a newly written turn; users not in the cache are loaded on their next read"""
+        buffer = self.users.get(user_id)
+        if buffer is None:
+            return
+        buffer.append(entry)
+        self.users.move_to_end(user_id)
+
+    def invalidate(self, user_id=None):
+        """Drop one user's buffer, or the whole cache"""
+        if user_id is None:
+            self.users.clear()
+        else:
+            self.users.pop(user_id, None)
+
+    def _evict(self):
+        """Evict least recently used users beyond max_users"""
+        while len(self.users) > self.max_users:
+            self.users.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "cached_users": len(self.users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": f"{(self.hits / lookups * 100) if lookups else 0:.1f}%"
+        }
+
+class HotPathCache:
+    """In-memory copy of the settings, channel and blacklist lookups made for every message"""
+    def __init__(self):
+        self.loaded = False
+        self.temperature = None
+        self.channels = {}
+        self.blacklisted_users = set()
+        self.response_cache_channels = {}
+        self.context_mode_channels = {}
+
+    def load(self, temperature, channels, blacklisted_users, response_cache_channels=(), context_mode_channels=()):
+        """Replace the cached state with a fresh snapshot from the database"""
+        self.temperature = temperature
+        self.channels = dict(channels)
+        self.blacklisted_users = set(blacklisted_users)
+        self.response_cache_channels = dict(response_cache_channels)
+        self.context_mode_channels = dict(context_mode_channels)
+        self.loaded = True
+
+    def get_channel(self, guild_id):
+        return self.channels.get(guild_id)
+
+    def set_channel(self, guild_id, channel_id):
+        self.channels[guild_id] = channel_id
+
+    def is_blacklisted(self, user_id):
+        return user_id in self.blacklisted_users
+
+    def set_blacklisted(self, user_id, is_blacklisted):
+        if is_blacklisted:
+            self.blacklisted_users.add(user_id)
+        else:
+            self.blacklisted_users.discard(user_id)
+
+    def get_response_cache(self, channel_id):
+        """Return the channel's response cache switch, or None to use the default"""
+        return self.response_cache_channels.get(channel_id)
+
+    def set_response_cache(self, channel_id, enabled):
+        if enabled is None:
+            self.response_cache_channels.pop(channel_id, None)
+        else:
+            self.response_cache_channels[channel_id] = enabled
+
+    def get_context_mode(self, channel_id):
+        """Return the channel's context mode, or None to use the default"""
+        return self.context_mode_channels.get(channel_id)
+
+    def set_context_mode(self, channel_id, mode):
+        if mode is None:
+            self.context_mode_channels.pop(channel_id, None)
+        else:
+            self.context_mode_channels[channel_id] = mode
+
+    def stats(self):
+        """Get cache statistics"""
+        return {
+            "loaded": self.loaded,
+            "channels": len(self.channels),
+            "blacklisted_users": len(self.blacklisted_users)
+        }
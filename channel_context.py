@@ -0,0 +1,159 @@
+import asyncio
+from collections import OrderedDict, deque
+from datetime import datetime
+from config import (
+    CONTEXT_MODE, CHANNEL_CONTEXT_MESSAGES, CHANNEL_CONTEXT_MAX_CHANNELS, CHANNEL_CONTEXT_FLUSH_INTERVAL
+)
+from cache import ChannelMessageEntry
+from prompt_builder import estimate_tokens
+
+def format_speaker_lines(entries):
+    """Messages as "Name: text" lines, so the model can tell the speakers apart"""
+    return "\n".join(f"{entry.author_name}: {entry.content}" for entry in entries)
+
+def build_channel_turns(entries, fixed_text, token_budget):
+    """Split a channel window (oldest first) into seed turns and the unanswered messages since the bot last spoke.
+
+    Turns alternate between the channel's messages, attributed per speaker, and the bot's replies, and
+    only the newest turns that fit beside fixed_text within token_budget are kept.
+    """
+    last_reply = max((index for index, entry in enumerate(entries) if entry.is_self), default=-1)
+    answered, unanswered = entries[:last_reply + 1], entries[last_reply + 1:]
+
+    turns = []
+    for entry in answered:
+        role = "assistant" if entry.is_self else "user"
+        content = entry.content if entry.is_self else f"{entry.author_name}: {entry.content}"
+        if turns and turns[-1]["role"] == role:
+            turns[-1]["content"] += "\n" + content
+        else:
+            turns.append({"role": role, "content": content})
+    # The seed opens with a user turn and the next message sent is a user turn
+    if turns and turns[0]["role"] == "assistant":
+        turns = turns[1:]
+
+    remaining = token_budget - estimate_tokens(fixed_text) - estimate_tokens(format_speaker_lines(unanswered))
+    kept = 0
+    for index in range(len(turns) - 2, -1, -2):
+        cost = estimate_tokens(turns[index]["content"]) + estimate_tokens(turns[index + 1]["content"])
+        if cost > remaining:
+            break
+        remaining -= cost
+        kept += 2
+    return turns[len(turns) - kept:], unanswered
+
+class ChannelContext:
+    """Rolling window of the recent messages in each channel-mode channel, fed from the gateway.
+
+    Windows live in memory (the least recently used channels are dropped past max_channels) and new
+    messages are written to the database in batches, so a restart or an evicted channel reloads its
+    window with one query instead of fetching history from Discord.
+    """
+    def __init__(self, db, window=CHANNEL_CONTEXT_MESSAGES, max_channels=CHANNEL_CONTEXT_MAX_CHANNELS,
+                 flush_interval=CHANNEL_CONTEXT_FLUSH_INTERVAL):
+        self.db = db
+        self.window_size = window
+        self.max_channels = max_channels
+        self.flush_interval = flush_interval
+        self.windows = OrderedDict()  # channel id -> deque of entries, oldest first
+        self.pending = []  # entries not written to the database yet
+        self.flushing = []
+        self.flush_task = None
+        self.recorded = 0
+        self.loads = 0
+        self.flushes = 0
+
+    def enabled_for(self, channel_id, dedicated_channel_id=None):
+        """Whether replies in this channel use the shared channel window"""
+        mode = self.db.hot_cache.get_context_mode(channel_id)
+        if mode is None:
+            # The global default only applies to the guild's dedicated channel
+            return CONTEXT_MODE == 'channel' and channel_id == dedicated_channel_id
+        return mode == 'channel'
+
+    def record(self, channel_id, author_id, author_name, content, is_self=False, message_id=None):
+        """Add a message to the channel's window and queue it for the next batched write.
+
+        is_self marks this bot's own replies; messages from other bots are attributed like anyone else's.
+        """
+        entry = ChannelMessageEntry(
+            channel_id, message_id, author_id, author_name, content, is_self, datetime.utcnow()
+        )
+        window = self.windows.get(channel_id)
+        if window is not None:
+            window.append(entry)
+            self.windows.move_to_end(channel_id)
+        self.pending.append(entry)
+        self.recorded += 1
+
+    def unsaved(self, channel_id):
+        return {entry for entry in self.flushing + self.pending if entry.channel_id == channel_id}
+
+    async def window(self, channel_id):
+        """Recent messages in a channel, oldest first, loading the window from the database on first use"""
+        window = self.windows.get(channel_id)
+        if window is None:
+            # Messages may be written while the query runs, so take unsaved ones from before and after it
+            unsaved = self.unsaved(channel_id)
+            stored = await self.db.get_channel_messages(channel_id, self.window_size)
+            unsaved |= self.unsaved(channel_id)
+            window = deque(sorted(set(stored) | unsaved, key=lambda entry: entry.timestamp),
+                           maxlen=self.window_size)
+            self.windows[channel_id] = window
+            self.loads += 1
+            while len(self.windows) > self.max_channels:
+                self.windows.popitem(last=False)
+        self.windows.move_to_end(channel_id)
+        return list(window)
+
+    def forget(self, channel_id):
+        """Drop a channel's in-memory window, e.g. after it leaves channel mode"""
+        self.windows.pop(channel_id, None)
+
+    async def flush(self):
+        """Write queued messages in one batch and trim each channel to the window size"""
+        if not self.pending or self.flushing:
+            return 0
+        self.flushing, self.pending = self.pending, []
+        try:
+            saved = await self.db.save_channel_messages(self.flushing, self.window_size)
+            if not saved:
+                # Keep the messages, ahead of anything recorded meanwhile, for the next attempt
+                self.pending = self.flushing + self.pending
+                return 0
+            self.flushes += 1
+            return len(self.flushing)
+        finally:
+            self.flushing = []
+
+    async def _flush_loop(self):
+        """Flush every flush_interval seconds"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start_flushing(self):
+        """Write queued messages in the background"""
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop_flushing(self):
+        """Stop the background writer and write out anything still queued"""
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+        await self.flush()
+
+    def stats(self):
+        """Get channel context statistics"""
+        return {
+            "channels": len(self.windows),
+            "recorded": self.recorded,
+            "pending_writes": len(self.pending),
+            "loads": self.loads,
+            "flushes": self.flushes
+        }
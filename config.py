@@ -26,14 +26,138 @@ API_KEYS = [
 if not API_KEYS:
     raise ValueError("No API keys found in .env file. Please add GEMINI_API_KEYS.")
 
+# Per-key rate limits and backoff
+GEMINI_RPM_LIMIT = int(os.getenv('GEMINI_RPM_LIMIT', '60'))
+GEMINI_TPM_LIMIT = int(os.getenv('GEMINI_TPM_LIMIT', '32000'))
+KEY_BACKOFF_BASE = float(os.getenv('KEY_BACKOFF_BASE', '2'))
+KEY_BACKOFF_MAX = float(os.getenv('KEY_BACKOFF_MAX', '300'))
+# Consecutive failures that open a key's circuit breaker, and how long it stays open before a probe
+KEY_ERROR_THRESHOLD = int(os.getenv('KEY_ERROR_THRESHOLD', '5'))
+KEY_ERROR_COOLDOWN = float(os.getenv('KEY_ERROR_COOLDOWN', '300'))
+KEY_ACQUIRE_TIMEOUT = float(os.getenv('KEY_ACQUIRE_TIMEOUT', '10'))
+# Requests per key per UTC day (0 = no daily limit), and how often key health is saved
+GEMINI_RPD_LIMIT = int(os.getenv('GEMINI_RPD_LIMIT', '0'))
+KEY_HEALTH_FLUSH_INTERVAL = float(os.getenv('KEY_HEALTH_FLUSH_INTERVAL', '60'))
+
+# Retry policy and global circuit breaker for Gemini calls
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', '3'))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '0.5'))
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '8'))
+GLOBAL_BREAKER_THRESHOLD = int(os.getenv('GLOBAL_BREAKER_THRESHOLD', '10'))
+GLOBAL_BREAKER_RESET_TIMEOUT = float(os.getenv('GLOBAL_BREAKER_RESET_TIMEOUT', '30'))
+# Minimum seconds between error notices posted to the same channel
+ERROR_NOTICE_INTERVAL = float(os.getenv('ERROR_NOTICE_INTERVAL', '60'))
+
 # Database Configuration
 DATABASE_URL = os.getenv('DATABASE_URL', "sqlite:///bot_data.db")
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+# SQLite connection pragmas, applied to every new connection
+SQLITE_TUNING = os.getenv('SQLITE_TUNING', 'True').lower() == 'true'
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL').upper()
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
 
 # Bot Configuration
 DEFAULT_TEMPERATURE = float(os.getenv('DEFAULT_TEMPERATURE', '0.7'))
 MAX_HISTORY_LENGTH = int(os.getenv('MAX_HISTORY_LENGTH', '10'))
+# Prompt size limits, in estimated tokens
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '3000'))
+SUMMARY_TOKEN_BUDGET = int(os.getenv('SUMMARY_TOKEN_BUDGET', '300'))
+# Turns that leave the prompt window are folded into the summary this many at a time (one model call)
+SUMMARY_FOLD_TURNS = int(os.getenv('SUMMARY_FOLD_TURNS', '10'))
+# Turns stored per user: the history window plus one batch waiting to be folded into the summary
+HISTORY_STORED_TURNS = MAX_HISTORY_LENGTH + SUMMARY_FOLD_TURNS
+HISTORY_CACHE_MAX_USERS = int(os.getenv('HISTORY_CACHE_MAX_USERS', '1000'))
+# 'inline' trims on every insert, 'background' trims in batches on a timer
+HISTORY_TRIM_MODE = os.getenv('HISTORY_TRIM_MODE', 'inline').lower()
+HISTORY_COMPACTION_INTERVAL = float(os.getenv('HISTORY_COMPACTION_INTERVAL', '60'))
+HISTORY_COMPACTION_BATCH_SIZE = int(os.getenv('HISTORY_COMPACTION_BATCH_SIZE', '500'))
+# 'immediate' commits each turn; 'write_behind' buffers turns and flushes them in batches
+HISTORY_WRITE_MODE = os.getenv('HISTORY_WRITE_MODE', 'immediate').lower()
+HISTORY_FLUSH_INTERVAL_MS = int(os.getenv('HISTORY_FLUSH_INTERVAL_MS', '500'))
+HISTORY_FLUSH_MAX_ROWS = int(os.getenv('HISTORY_FLUSH_MAX_ROWS', '100'))
+# Turns kept in memory while flushes fail; the oldest are dropped beyond this
+HISTORY_BUFFER_MAX_ROWS = int(os.getenv('HISTORY_BUFFER_MAX_ROWS', '10000'))
 DEFAULT_CHANNEL_ID = None
 
+# Generation Concurrency Configuration
+MAX_CONCURRENT_GENERATIONS = int(os.getenv('MAX_CONCURRENT_GENERATIONS', '32'))
+GENERATION_EXECUTOR_WORKERS = int(os.getenv('GENERATION_EXECUTOR_WORKERS', str(MAX_CONCURRENT_GENERATIONS)))
+
+# Streaming Configuration
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', 'True').lower() == 'true'
+STREAM_EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', '1.0'))
+
+# Chat Session Pool Configuration
+CHAT_SESSION_MAX = int(os.getenv('CHAT_SESSION_MAX', '500'))
+CHAT_SESSION_IDLE_TIMEOUT = float(os.getenv('CHAT_SESSION_IDLE_TIMEOUT', '900'))
+
+# Persona Configuration
+PERSONA_FILE = os.getenv('PERSONA_FILE', 'prompt.txt')
+# Seconds between checks of the persona file's mtime; 0 disables the watcher
+PERSONA_POLL_INTERVAL = float(os.getenv('PERSONA_POLL_INTERVAL', '5'))
+
+# Response Cache Configuration
+# Default for channels without their own setting (see !cache)
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'False').lower() == 'true'
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+# 'exclude' ignores history; 'bucket' keys on the conversation length bucket (new, short, long)
+RESPONSE_CACHE_HISTORY = os.getenv('RESPONSE_CACHE_HISTORY', 'exclude').lower()
+
+# Message Queue Configuration
+# A burst of messages from one user in one channel, each within this many seconds of the last, is answered
+# together; a single message is answered without waiting
+MESSAGE_DEBOUNCE_SECONDS = float(os.getenv('MESSAGE_DEBOUNCE_SECONDS', '1.5'))
+MESSAGE_BATCH_MAX = int(os.getenv('MESSAGE_BATCH_MAX', '5'))
+
+# Conversation Context Configuration
+# 'user' builds prompts from each user's own history; 'channel' from the recent messages of the
+# guild's dedicated channel, attributed per speaker (override per channel with !context)
+CONTEXT_MODE = os.getenv('CONTEXT_MODE', 'user').lower()
+CHANNEL_CONTEXT_MESSAGES = int(os.getenv('CHANNEL_CONTEXT_MESSAGES', '30'))
+CHANNEL_CONTEXT_MAX_CHANNELS = int(os.getenv('CHANNEL_CONTEXT_MAX_CHANNELS', '200'))
+# Seconds between batched writes of channel messages to the database
+CHANNEL_CONTEXT_FLUSH_INTERVAL = float(os.getenv('CHANNEL_CONTEXT_FLUSH_INTERVAL', '5'))
+
+# Sharding Configuration
+# 'off' runs one unsharded bot; 'auto' runs an AutoShardedBot (set SHARD_COUNT, or 0 for Discord's recommendation)
+BOT_SHARDING = os.getenv('BOT_SHARDING', 'off').lower()
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+# Shards run by this process; set by launcher.py for each worker
+SHARD_IDS = [int(shard) for shard in os.getenv('SHARD_IDS', '').split(',') if shard.strip()]
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', '1'))
+# SQLite file shared by all workers for key rate limits and health; empty keeps them in-process
+SHARED_STATE_PATH = os.getenv('SHARED_STATE_PATH', '')
+# Seconds between reloads of settings and the blacklist changed by other workers; 0 disables
+HOT_CACHE_REFRESH_INTERVAL = float(os.getenv('HOT_CACHE_REFRESH_INTERVAL', '0'))
+# Seconds to wait after a failed hot cache load before a message triggers another one
+HOT_CACHE_RETRY_INTERVAL = float(os.getenv('HOT_CACHE_RETRY_INTERVAL', '10'))
+
+# Long-Term Memory Configuration
+# Embeds every stored turn into an on-disk vector index and recalls relevant old turns into the prompt
+MEMORY_ENABLED = os.getenv('MEMORY_ENABLED', 'False').lower() == 'true'
+MEMORY_DIR = os.getenv('MEMORY_DIR', 'memory')
+MEMORY_DIMENSIONS = int(os.getenv('MEMORY_DIMENSIONS', '256'))
+MEMORY_TOP_K = int(os.getenv('MEMORY_TOP_K', '3'))
+# Cosine similarity a past turn needs to be recalled
+MEMORY_MIN_SCORE = float(os.getenv('MEMORY_MIN_SCORE', '0.3'))
+MEMORY_FLUSH_INTERVAL = float(os.getenv('MEMORY_FLUSH_INTERVAL', '30'))
+
+# Metrics Configuration
+# Port for the Prometheus /metrics endpoint; 0 disables it
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+
+# Shutdown Configuration
+# Seconds to finish replies in flight after SIGTERM/SIGINT before buffered state is flushed
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv('SHUTDOWN_DRAIN_TIMEOUT', '20'))
+
 # Advanced Configuration
 DEBUG_MODE = os.getenv('DEBUG_MODE', 'False').lower() == 'true'
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -54,6 +178,22 @@ def validate_config():
         if len(key) < 20:  # Basic length check for API keys
             errors.append(f"Invalid API key format: {key[:6]}...")
     
+    # Validate rate limits
+    if GEMINI_RPM_LIMIT < 1:
+        errors.append(f"Invalid GEMINI_RPM_LIMIT: {GEMINI_RPM_LIMIT}")
+    if GEMINI_TPM_LIMIT < 1:
+        errors.append(f"Invalid GEMINI_TPM_LIMIT: {GEMINI_TPM_LIMIT}")
+    if KEY_ERROR_THRESHOLD < 1:
+        errors.append(f"Invalid KEY_ERROR_THRESHOLD: {KEY_ERROR_THRESHOLD}")
+    if GEMINI_RPD_LIMIT < 0:
+        errors.append(f"Invalid GEMINI_RPD_LIMIT: {GEMINI_RPD_LIMIT}")
+    if KEY_HEALTH_FLUSH_INTERVAL <= 0:
+        errors.append(f"Invalid KEY_HEALTH_FLUSH_INTERVAL: {KEY_HEALTH_FLUSH_INTERVAL}")
+    if RETRY_MAX_ATTEMPTS < 1:
+        errors.append(f"Invalid RETRY_MAX_ATTEMPTS: {RETRY_MAX_ATTEMPTS}")
+    if GLOBAL_BREAKER_THRESHOLD < 1:
+        errors.append(f"Invalid GLOBAL_BREAKER_THRESHOLD: {GLOBAL_BREAKER_THRESHOLD}")
+    
     # Validate temperature
     if not (0.0 <= DEFAULT_TEMPERATURE <= 1.0):
         errors.append(f"Invalid DEFAULT_TEMPERATURE: {DEFAULT_TEMPERATURE}")
@@ -62,6 +202,126 @@ def validate_config():
     if MAX_HISTORY_LENGTH < 1:
         errors.append(f"Invalid MAX_HISTORY_LENGTH: {MAX_HISTORY_LENGTH}")
     
+    # Validate prompt budgets
+    if PROMPT_TOKEN_BUDGET < 1:
+        errors.append(f"Invalid PROMPT_TOKEN_BUDGET: {PROMPT_TOKEN_BUDGET}")
+    if not (0 < SUMMARY_TOKEN_BUDGET < PROMPT_TOKEN_BUDGET):
+        errors.append(f"Invalid SUMMARY_TOKEN_BUDGET: {SUMMARY_TOKEN_BUDGET}")
+    if SUMMARY_FOLD_TURNS < 1:
+        errors.append(f"Invalid SUMMARY_FOLD_TURNS: {SUMMARY_FOLD_TURNS}")
+    
+    # Validate history cache size (0 disables the cache)
+    if HISTORY_CACHE_MAX_USERS < 0:
+        errors.append(f"Invalid HISTORY_CACHE_MAX_USERS: {HISTORY_CACHE_MAX_USERS}")
+    
+    # Validate history trimming
+    if HISTORY_TRIM_MODE not in ('inline', 'background'):
+        errors.append(f"Invalid HISTORY_TRIM_MODE: {HISTORY_TRIM_MODE}")
+    if HISTORY_COMPACTION_INTERVAL <= 0:
+        errors.append(f"Invalid HISTORY_COMPACTION_INTERVAL: {HISTORY_COMPACTION_INTERVAL}")
+    if HISTORY_COMPACTION_BATCH_SIZE < 1:
+        errors.append(f"Invalid HISTORY_COMPACTION_BATCH_SIZE: {HISTORY_COMPACTION_BATCH_SIZE}")
+    
+    # Validate history writes
+    if HISTORY_WRITE_MODE not in ('immediate', 'write_behind'):
+        errors.append(f"Invalid HISTORY_WRITE_MODE: {HISTORY_WRITE_MODE}")
+    if HISTORY_FLUSH_INTERVAL_MS < 1:
+        errors.append(f"Invalid HISTORY_FLUSH_INTERVAL_MS: {HISTORY_FLUSH_INTERVAL_MS}")
+    if HISTORY_FLUSH_MAX_ROWS < 1:
+        errors.append(f"Invalid HISTORY_FLUSH_MAX_ROWS: {HISTORY_FLUSH_MAX_ROWS}")
+    if HISTORY_BUFFER_MAX_ROWS < HISTORY_FLUSH_MAX_ROWS:
+        errors.append(f"HISTORY_BUFFER_MAX_ROWS ({HISTORY_BUFFER_MAX_ROWS}) must be at least HISTORY_FLUSH_MAX_ROWS")
+    
+    # Validate database pool sizing
+    if DB_POOL_SIZE < 1:
+        errors.append(f"Invalid DB_POOL_SIZE: {DB_POOL_SIZE}")
+    if DB_MAX_OVERFLOW < 0:
+        errors.append(f"Invalid DB_MAX_OVERFLOW: {DB_MAX_OVERFLOW}")
+    
+    # Validate SQLite pragmas
+    if SQLITE_JOURNAL_MODE not in ('WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'OFF'):
+        errors.append(f"Invalid SQLITE_JOURNAL_MODE: {SQLITE_JOURNAL_MODE}")
+    if SQLITE_SYNCHRONOUS not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+        errors.append(f"Invalid SQLITE_SYNCHRONOUS: {SQLITE_SYNCHRONOUS}")
+    if SQLITE_CACHE_SIZE_KB < 0 or SQLITE_MMAP_SIZE < 0 or SQLITE_BUSY_TIMEOUT_MS < 0:
+        errors.append("SQLite cache, mmap and busy timeout sizes must not be negative")
+    
+    # Validate generation concurrency
+    if MAX_CONCURRENT_GENERATIONS < 1:
+        errors.append(f"Invalid MAX_CONCURRENT_GENERATIONS: {MAX_CONCURRENT_GENERATIONS}")
+    if GENERATION_EXECUTOR_WORKERS < 1:
+        errors.append(f"Invalid GENERATION_EXECUTOR_WORKERS: {GENERATION_EXECUTOR_WORKERS}")
+    
+    # Validate streaming edit rate (Discord allows roughly 5 edits per 5 seconds)
+    if STREAM_EDIT_INTERVAL < 0.2:
+        errors.append(f"Invalid STREAM_EDIT_INTERVAL: {STREAM_EDIT_INTERVAL}")
+    
+    # Validate chat session pool
+    if CHAT_SESSION_MAX < 1:
+        errors.append(f"Invalid CHAT_SESSION_MAX: {CHAT_SESSION_MAX}")
+    if CHAT_SESSION_IDLE_TIMEOUT <= 0:
+        errors.append(f"Invalid CHAT_SESSION_IDLE_TIMEOUT: {CHAT_SESSION_IDLE_TIMEOUT}")
+    
+    # Validate persona watcher
+    if PERSONA_POLL_INTERVAL < 0:
+        errors.append(f"Invalid PERSONA_POLL_INTERVAL: {PERSONA_POLL_INTERVAL}")
+    
+    # Validate response cache
+    if RESPONSE_CACHE_TTL <= 0:
+        errors.append(f"Invalid RESPONSE_CACHE_TTL: {RESPONSE_CACHE_TTL}")
+    if RESPONSE_CACHE_MAX_ENTRIES < 1:
+        errors.append(f"Invalid RESPONSE_CACHE_MAX_ENTRIES: {RESPONSE_CACHE_MAX_ENTRIES}")
+    if RESPONSE_CACHE_HISTORY not in ('exclude', 'bucket'):
+        errors.append(f"Invalid RESPONSE_CACHE_HISTORY: {RESPONSE_CACHE_HISTORY}")
+    
+    # Validate message queue
+    if MESSAGE_DEBOUNCE_SECONDS < 0:
+        errors.append(f"Invalid MESSAGE_DEBOUNCE_SECONDS: {MESSAGE_DEBOUNCE_SECONDS}")
+    if MESSAGE_BATCH_MAX < 1:
+        errors.append(f"Invalid MESSAGE_BATCH_MAX: {MESSAGE_BATCH_MAX}")
+    
+    # Validate conversation context
+    if CONTEXT_MODE not in ('user', 'channel'):
+        errors.append(f"Invalid CONTEXT_MODE: {CONTEXT_MODE}")
+    if CHANNEL_CONTEXT_MESSAGES < 1:
+        errors.append(f"Invalid CHANNEL_CONTEXT_MESSAGES: {CHANNEL_CONTEXT_MESSAGES}")
+    if CHANNEL_CONTEXT_MAX_CHANNELS < 1:
+        errors.append(f"Invalid CHANNEL_CONTEXT_MAX_CHANNELS: {CHANNEL_CONTEXT_MAX_CHANNELS}")
+    if CHANNEL_CONTEXT_FLUSH_INTERVAL <= 0:
+        errors.append(f"Invalid CHANNEL_CONTEXT_FLUSH_INTERVAL: {CHANNEL_CONTEXT_FLUSH_INTERVAL}")
+    
+    # Validate sharding
+    if BOT_SHARDING not in ('off', 'auto'):
+        errors.append(f"Invalid BOT_SHARDING: {BOT_SHARDING}")
+    if SHARD_COUNT < 0:
+        errors.append(f"Invalid SHARD_COUNT: {SHARD_COUNT}")
+    if SHARD_IDS and not (SHARD_COUNT and all(0 <= shard < SHARD_COUNT for shard in SHARD_IDS)):
+        errors.append(f"Invalid SHARD_IDS for SHARD_COUNT={SHARD_COUNT}: {SHARD_IDS}")
+    if WORKER_PROCESSES < 1:
+        errors.append(f"Invalid WORKER_PROCESSES: {WORKER_PROCESSES}")
+    if HOT_CACHE_REFRESH_INTERVAL < 0:
+        errors.append(f"Invalid HOT_CACHE_REFRESH_INTERVAL: {HOT_CACHE_REFRESH_INTERVAL}")
+    if HOT_CACHE_RETRY_INTERVAL < 0:
+        errors.append(f"Invalid HOT_CACHE_RETRY_INTERVAL: {HOT_CACHE_RETRY_INTERVAL}")
+    
+    # Validate long-term memory
+    if MEMORY_DIMENSIONS < 16:
+        errors.append(f"Invalid MEMORY_DIMENSIONS: {MEMORY_DIMENSIONS}")
+    if MEMORY_TOP_K < 1:
+        errors.append(f"Invalid MEMORY_TOP_K: {MEMORY_TOP_K}")
+    if not (-1 <= MEMORY_MIN_SCORE <= 1):
+        errors.append(f"Invalid MEMORY_MIN_SCORE: {MEMORY_MIN_SCORE}")
+    if MEMORY_FLUSH_INTERVAL <= 0:
+        errors.append(f"Invalid MEMORY_FLUSH_INTERVAL: {MEMORY_FLUSH_INTERVAL}")
+    
+    # Validate shutdown
+    if SHUTDOWN_DRAIN_TIMEOUT < 0:
+        errors.append(f"Invalid SHUTDOWN_DRAIN_TIMEOUT: {SHUTDOWN_DRAIN_TIMEOUT}")
+    
+    # Validate metrics endpoint
+    if not (0 <= METRICS_PORT <= 65535):
+        errors.append(f"Invalid METRICS_PORT: {METRICS_PORT}")
+    
     if errors:
         raise ValueError("\n".join(errors))
 
@@ -72,9 +332,31 @@ def print_config_summary():
     print(f"Timestamp: {CURRENT_TIME} UTC")
     print(f"User: {CURRENT_USER}")
     print(f"Database URL: {DATABASE_URL}")
+    print(f"Database Pool: size={DB_POOL_SIZE}, overflow={DB_MAX_OVERFLOW}, timeout={DB_POOL_TIMEOUT}s")
+    if DATABASE_URL.startswith("sqlite"):
+        print(f"SQLite Tuning: {SQLITE_TUNING} (journal={SQLITE_JOURNAL_MODE}, synchronous={SQLITE_SYNCHRONOUS})")
     print(f"Number of API Keys: {len(API_KEYS)}")
+    print(f"Per-Key Limits: {GEMINI_RPM_LIMIT} RPM, {GEMINI_TPM_LIMIT} TPM, {GEMINI_RPD_LIMIT or 'unlimited'} RPD")
+    print(f"Retries: {RETRY_MAX_ATTEMPTS} attempts, breaker opens after {GLOBAL_BREAKER_THRESHOLD} failures")
     print(f"Default Temperature: {DEFAULT_TEMPERATURE}")
     print(f"Max History Length: {MAX_HISTORY_LENGTH}")
+    print(f"Prompt Token Budget: {PROMPT_TOKEN_BUDGET} (summary: {SUMMARY_TOKEN_BUDGET}, folded {SUMMARY_FOLD_TURNS} turns at a time)")
+    print(f"History Cache Users: {HISTORY_CACHE_MAX_USERS}")
+    print(f"History Trim Mode: {HISTORY_TRIM_MODE}")
+    print(f"History Write Mode: {HISTORY_WRITE_MODE} (flush every {HISTORY_FLUSH_INTERVAL_MS}ms or {HISTORY_FLUSH_MAX_ROWS} rows, buffer at most {HISTORY_BUFFER_MAX_ROWS})")
+    print(f"Max Concurrent Generations: {MAX_CONCURRENT_GENERATIONS}")
+    print(f"Generation Executor Workers: {GENERATION_EXECUTOR_WORKERS}")
+    print(f"Streaming: {STREAM_RESPONSES} (edit interval: {STREAM_EDIT_INTERVAL}s)")
+    print(f"Chat Sessions: max={CHAT_SESSION_MAX}, idle timeout={CHAT_SESSION_IDLE_TIMEOUT}s")
+    print(f"Persona File: {PERSONA_FILE} (poll interval: {PERSONA_POLL_INTERVAL}s)")
+    print(f"Response Cache: {RESPONSE_CACHE_ENABLED} (ttl: {RESPONSE_CACHE_TTL}s, max: {RESPONSE_CACHE_MAX_ENTRIES}, history: {RESPONSE_CACHE_HISTORY})")
+    print(f"Message Debounce: {MESSAGE_DEBOUNCE_SECONDS}s (batch max: {MESSAGE_BATCH_MAX})")
+    print(f"Context Mode: {CONTEXT_MODE} (channel window: {CHANNEL_CONTEXT_MESSAGES} messages, flush every {CHANNEL_CONTEXT_FLUSH_INTERVAL}s)")
+    print(f"Sharding: {BOT_SHARDING} (shards: {SHARD_IDS or 'all'} of {SHARD_COUNT or 'auto'}, workers: {WORKER_PROCESSES})")
+    print(f"Shared Key State: {SHARED_STATE_PATH or 'in-process'}")
+    print(f"Long-Term Memory: {MEMORY_ENABLED} (dir: {MEMORY_DIR}, top {MEMORY_TOP_K}, min score {MEMORY_MIN_SCORE})")
+    print(f"Metrics Endpoint: {f'{METRICS_HOST}:{METRICS_PORT}' if METRICS_PORT else 'disabled'}")
+    print(f"Shutdown Drain Timeout: {SHUTDOWN_DRAIN_TIMEOUT}s")
     print(f"Debug Mode: {DEBUG_MODE}")
     print(f"Log Level: {LOG_LEVEL}")
     print("=== End Configuration ===\n")
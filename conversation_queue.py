@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime
+from config import MESSAGE_DEBOUNCE_SECONDS, MESSAGE_BATCH_MAX
+
+class ConversationQueue:
+    """Runs one handler at a time per conversation, coalescing messages that arrive close together"""
+    def __init__(self, handler, debounce=MESSAGE_DEBOUNCE_SECONDS, max_batch=MESSAGE_BATCH_MAX):
+        self.handler = handler  # async callable taking a list of queued items
+        self.debounce = debounce
+        self.max_batch = max_batch
+        self.pending = {}  # conversation key -> items waiting to be handled
+        self.workers = {}  # conversation key -> worker task
+        self.batches = 0
+        self.items = 0
+        self.draining = False  # set during shutdown: queued batches are handled without waiting
+
+    def log_error(self, message, error=None):
+        """Log error messages with timestamp"""
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        error_details = f": {str(error)}" if error else ""
+        print(f"[{timestamp}] ERROR: {message}{error_details}")
+
+    def submit(self, key, item):
+        """Queue an item for its conversation, starting the conversation's worker if needed"""
+        self.pending.setdefault(key, []).append(item)
+        self.items += 1
+        if key not in self.workers:
+            self.workers[key] = asyncio.create_task(self._worker(key))
+
+    async def _settle(self, key):
+        """Wait out a burst until no new item has arrived for one debounce window, or the batch is full.
+
+        A lone item is handled at once; only items that piled up (e.g. while the previous reply
+        was running) are taken as a burst worth waiting on.
+        """
+        while True:
+            count = len(self.pending[key])
+            if count == 1 or count >= self.max_batch or self.draining:
+                return
+            await asyncio.sleep(self.debounce)
+            if len(self.pending[key]) == count:
+                return
+
+    async def _worker(self, key):
+        """Handle this conversation's items in arrival order, one batch at a time"""
+        try:
+            while self.pending[key]:
+                await self._settle(key)
+                batch = self.pending[key][:self.max_batch]
+                del self.pending[key][:len(batch)]
+                self.batches += 1
+                try:
+                    await self.handler(batch)
+                except Exception as e:
+                    self.log_error(f"Error handling queued messages for {key}", e)
+        finally:
+            self.pending.pop(key, None)
+            self.workers.pop(key, None)
+
+    async def drain(self, timeout):
+        """Finish queued and running batches within timeout seconds, then cancel the rest; returns items dropped"""
+        self.draining = True
+        tasks = list(self.workers.values())
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        dropped = sum(len(items) for items in self.pending.values())
+        await self.close()
+        return dropped
+
+    async def close(self):
+        """Cancel all workers and drop queued items"""
+        tasks = list(self.workers.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        """Get queue statistics"""
+        return {
+            "active_conversations": len(self.workers),
+            "queued_messages": sum(len(items) for items in self.pending.values()),
+            "messages": self.items,
+            "batches": self.batches,
+            "coalesced": self.items - self.batches - sum(len(items) for items in self.pending.values())
+        }
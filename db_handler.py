@@ -1,14 +1,34 @@
-from models import Session, ChatHistory, ChannelConfig, BotSettings, UserAccess
-from datetime import datetime
+from models import (
+    Session, AsyncSessionFactory, async_engine, ChatHistory, ChannelConfig, BotSettings, UserAccess,
+    ConversationSummary, ChannelSettings, ResponseCacheEntry, GuildPersona, ApiKeyHealth,
+    ChannelMessage
+)
+from sqlalchemy import select, insert, update, delete, func
+from cache import HistoryCache, HistoryEntry, HotPathCache, LRUCache, SummaryEntry, ChannelMessageEntry
+from datetime import datetime, timedelta
+import asyncio
+import time
 import traceback
-from config import DEBUG_MODE, MAX_HISTORY_LENGTH
+from config import (
+    DEBUG_MODE, MAX_HISTORY_LENGTH, HISTORY_STORED_TURNS, HISTORY_TRIM_MODE, HISTORY_CACHE_MAX_USERS,
+    HISTORY_COMPACTION_INTERVAL, HISTORY_COMPACTION_BATCH_SIZE, HISTORY_WRITE_MODE,
+    HISTORY_FLUSH_INTERVAL_MS, HISTORY_FLUSH_MAX_ROWS, HISTORY_BUFFER_MAX_ROWS, HOT_CACHE_RETRY_INTERVAL
+)
 
-class DatabaseHandler:
+# ApiKeyHealth columns copied to and from AIHandler.export_key_health()
+KEY_HEALTH_COLUMNS = (
+    "errors", "last_error", "total_requests", "last_request", "cooldown_until", "consecutive_failures",
+    "breaker_state", "breaker_failures", "breaker_opened_at", "quota_date", "daily_requests", "daily_tokens"
+)
+# Counters every worker adds to: export_key_health() gives increments since the last save for these
+KEY_HEALTH_COUNTERS = ("errors", "total_requests")
+
+class BaseDatabaseHandler:
+    """Logging and bookkeeping shared by the sync and async handlers"""
     def __init__(self):
-        """Initialize database handler with session and logging"""
-        self.session = Session()
         self.startup_time = datetime.utcnow()
-        print(f"Database Handler initialized at {self.startup_time.strftime('%Y-%m-%d %H:%M:%S')} UTC")
+        self.history_cache = HistoryCache()
+        print(f"{type(self).__name__} initialized at {self.startup_time.strftime('%Y-%m-%d %H:%M:%S')} UTC")
 
     def log_error(self, operation, error):
         """Log database operation errors"""
@@ -24,6 +44,38 @@ class DatabaseHandler:
             current_time = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
             print(f"[{current_time}] Database Operation - {operation}: {details}")
 
+    def _to_entries(self, rows):
+        """Detach ChatHistory rows into cacheable HistoryEntry tuples"""
+        return [HistoryEntry(row.user_id, row.message, row.response, row.timestamp) for row in rows]
+
+    def _trim_statement(self, user_id, keep=HISTORY_STORED_TURNS):
+        """Single DELETE removing everything but the user's newest `keep` rows"""
+        newest = select(ChatHistory.id)\
+            .where(ChatHistory.user_id == user_id)\
+            .order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc())\
+            .limit(keep)
+        return delete(ChatHistory)\
+            .where(ChatHistory.user_id == user_id)\
+            .where(ChatHistory.id.not_in(newest))
+
+    def _compaction_statement(self, keep=HISTORY_STORED_TURNS, batch_size=HISTORY_COMPACTION_BATCH_SIZE):
+        """DELETE of up to `batch_size` rows beyond the newest `keep` per user, across all users"""
+        ranked = select(
+            ChatHistory.id,
+            func.row_number().over(
+                partition_by=ChatHistory.user_id,
+                order_by=(ChatHistory.timestamp.desc(), ChatHistory.id.desc())
+            ).label("position")
+        ).subquery()
+        overflow = select(ranked.c.id).where(ranked.c.position > keep).limit(batch_size)
+        return delete(ChatHistory).where(ChatHistory.id.in_(overflow))
+
+class DatabaseHandler(BaseDatabaseHandler):
+    def __init__(self):
+        """Initialize database handler with session and logging"""
+        self.session = Session()
+        super().__init__()
+
     def add_chat_history(self, user_id, message, response):
         """Add a new chat history entry"""
         try:
@@ -35,46 +87,64 @@ class DatabaseHandler:
                 timestamp=datetime.utcnow()
             )
             self.session.add(chat_entry)
+            
+            # Trim old entries in the same transaction as the insert
+            if HISTORY_TRIM_MODE == 'inline':
+                self.session.flush()
+                self._cleanup_old_history(user_id)
+            
             self.session.commit()
+            self.history_cache.append(user_id, HistoryEntry(user_id, message, response, chat_entry.timestamp))
             
             self.log_operation("add_chat_history", f"User: {user_id}")
             
-            # Cleanup old entries if needed
-            self._cleanup_old_history(user_id)
-            
         except Exception as e:
             self.log_error("add_chat_history", e)
             self.session.rollback()
             raise
 
     def _cleanup_old_history(self, user_id):
-        """Clean up old chat history entries beyond MAX_HISTORY_LENGTH"""
+        """Clean up old chat history entries beyond HISTORY_STORED_TURNS (caller commits)"""
+        result = self.session.execute(self._trim_statement(user_id))
+        if result.rowcount:
+            self.log_operation("cleanup_history", f"Removed {result.rowcount} old entries for user {user_id}")
+
+    def compact_history(self, batch_size=HISTORY_COMPACTION_BATCH_SIZE):
+        """Trim every user's history to HISTORY_STORED_TURNS in batches"""
+        removed = 0
         try:
-            # Get all entries for user, ordered by timestamp
-            entries = self.session.query(ChatHistory)\
-                .filter(ChatHistory.user_id == user_id)\
-                .order_by(ChatHistory.timestamp.desc())\
-                .all()
-            
-            # If we have more entries than MAX_HISTORY_LENGTH, remove the oldest ones
-            if len(entries) > MAX_HISTORY_LENGTH:
-                for entry in entries[MAX_HISTORY_LENGTH:]:
-                    self.session.delete(entry)
+            while True:
+                result = self.session.execute(self._compaction_statement(batch_size=batch_size))
                 self.session.commit()
-                self.log_operation("cleanup_history", f"Removed {len(entries) - MAX_HISTORY_LENGTH} old entries for user {user_id}")
-                
+                removed += result.rowcount
+                if result.rowcount < batch_size:
+                    break
+            
+            if removed:
+                self.log_operation("compact_history", f"Removed {removed} old entries")
+            return removed
+            
         except Exception as e:
-            self.log_error("cleanup_history", e)
+            self.log_error("compact_history", e)
             self.session.rollback()
+            return removed
 
     def get_chat_history(self, user_id, limit=MAX_HISTORY_LENGTH):
         """Get chat history for a user"""
+        cached = self.history_cache.get(user_id, limit)
+        if cached is not None:
+            return cached
+        
         try:
-            history = self.session.query(ChatHistory)\
+            # Read every stored turn on a miss, so the cached buffer serves any later limit
+            rows = self.session.query(ChatHistory)\
                 .filter(ChatHistory.user_id == user_id)\
                 .order_by(ChatHistory.timestamp.desc())\
-                .limit(limit)\
+                .limit(max(limit, self.history_cache.turns_per_user))\
                 .all()
+            history = self._to_entries(rows)
+            self.history_cache.load(user_id, history)
+            history = history[:limit]
             
             self.log_operation("get_chat_history", f"User: {user_id}, Entries: {len(history)}")
             return history
@@ -214,6 +284,7 @@ class DatabaseHandler:
                 "blacklisted_users": self.session.query(UserAccess)\
                     .filter(UserAccess.is_blacklisted == True).count(),
                 "configured_channels": self.session.query(ChannelConfig).count(),
+                "history_cache": self.history_cache.stats(),
                 "uptime": str(datetime.utcnow() - self.startup_time)
             }
             return stats
@@ -230,6 +301,810 @@ class DatabaseHandler:
         except Exception as e:
             self.log_error("cleanup", e)
 
+class AsyncDatabaseHandler(BaseDatabaseHandler):
+    """Async database handler using a pooled engine and one session per operation"""
+    def __init__(self, session_factory=AsyncSessionFactory, engine=async_engine):
+        self.session_factory = session_factory
+        self.engine = engine
+        self.compaction_task = None
+        self.refresh_task = None
+        # Write-behind buffer: turns not yet written, and the batch currently being flushed
+        self.write_buffer = []
+        self.flushing = []
+        self.flush_task = None
+        self.flush_wakeup = None
+        self.flush_lock = asyncio.Lock()
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.rows_dropped = 0
+        self.hot_cache = HotPathCache()
+        self.hot_cache_lock = asyncio.Lock()
+        # Monotonic time before which ensure_hot_cache does not retry a failed load
+        self.hot_cache_retry_at = 0
+        self.summary_cache = LRUCache(HISTORY_CACHE_MAX_USERS)
+        super().__init__()
+
+    async def load_hot_cache(self):
+        """Load settings, channel configs and blacklisted users into memory"""
+        try:
+            async with self.session_factory() as session:
+                temperature = await session.scalar(select(BotSettings.temperature))
+                channels = (await session.execute(
+                    select(ChannelConfig.guild_id, ChannelConfig.channel_id)
+                )).all()
+                blacklisted = (await session.execute(
+                    select(UserAccess.user_id).filter(UserAccess.is_blacklisted == True)
+                )).scalars().all()
+                response_cache_channels = (await session.execute(
+                    select(ChannelSettings.channel_id, ChannelSettings.response_cache)
+                    .filter(ChannelSettings.response_cache.is_not(None))
+                )).all()
+                context_mode_channels = (await session.execute(
+                    select(ChannelSettings.channel_id, ChannelSettings.context_mode)
+                    .filter(ChannelSettings.context_mode.is_not(None))
+                )).all()
+            
+            self.hot_cache.load(temperature, channels, blacklisted, response_cache_channels, context_mode_channels)
+            self.log_operation("load_hot_cache", f"Channels: {len(channels)}, Blacklisted: {len(blacklisted)}")
+            
+        except Exception as e:
+            self.hot_cache_retry_at = time.monotonic() + HOT_CACHE_RETRY_INTERVAL
+            self.log_error("load_hot_cache", e)
+
+    async def ensure_hot_cache(self):
+        """Load the hot-path cache if it is missing, once for concurrent callers and not again until HOT_CACHE_RETRY_INTERVAL after a failure"""
+        if self.hot_cache.loaded or time.monotonic() < self.hot_cache_retry_at:
+            return
+        async with self.hot_cache_lock:
+            if self.hot_cache.loaded or time.monotonic() < self.hot_cache_retry_at:
+                return
+            await self.load_hot_cache()
+
+    async def _hot_cache_refresh_loop(self, interval):
+        """Reload the hot-path cache every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.load_hot_cache()
+
+    def start_hot_cache_refresh(self, interval):
+        """Periodically reload the hot-path cache, for changes made by other processes; 0 disables"""
+        if interval <= 0:
+            return
+        if self.refresh_task and not self.refresh_task.done():
+            return
+        self.refresh_task = asyncio.create_task(self._hot_cache_refresh_loop(interval))
+        self.log_operation("start_hot_cache_refresh", f"Interval: {interval}s")
+
+    async def stop_hot_cache_refresh(self):
+        """Cancel the hot-path cache refresh task"""
+        if self.refresh_task:
+            self.refresh_task.cancel()
+            try:
+                await self.refresh_task
+            except asyncio.CancelledError:
+                pass
+            self.refresh_task = None
+
+    async def add_chat_history(self, user_id, message, response):
+        """Add a new chat history entry; returns its timestamp"""
+        if HISTORY_WRITE_MODE == 'write_behind':
+            return self.buffer_chat_history(user_id, message, response)
+        
+        try:
+            timestamp = datetime.utcnow()
+            async with self.session_factory() as session:
+                async with session.begin():
+                    session.add(ChatHistory(
+                        user_id=user_id,
+                        message=message,
+                        response=response,
+                        timestamp=timestamp
+                    ))
+                    
+                    # Trim old entries in the same transaction as the insert
+                    if HISTORY_TRIM_MODE == 'inline':
+                        await session.flush()
+                        await self._cleanup_old_history(session, user_id)
+            self.history_cache.append(user_id, HistoryEntry(user_id, message, response, timestamp))
+            
+            self.log_operation("add_chat_history", f"User: {user_id}")
+            return timestamp
+            
+        except Exception as e:
+            self.log_error("add_chat_history", e)
+            raise
+
+    def buffer_chat_history(self, user_id, message, response):
+        """Queue a turn for the next batched flush; it is visible to reads immediately. Returns its timestamp"""
+        entry = HistoryEntry(user_id, message, response, datetime.utcnow())
+        self.write_buffer.append(entry)
+        self._drop_overflow()
+        self.history_cache.append(user_id, entry)
+        if len(self.write_buffer) >= HISTORY_FLUSH_MAX_ROWS and self.flush_wakeup:
+            self.flush_wakeup.set()
+        self.log_operation("buffer_chat_history", f"User: {user_id}, Buffered: {len(self.write_buffer)}")
+        return entry.timestamp
+
+    async def flush_chat_history(self):
+        """Write all buffered turns with one executemany INSERT and trim in a single transaction"""
+        async with self.flush_lock:
+            if not self.write_buffer:
+                return 0
+            self.flushing, self.write_buffer = self.write_buffer, []
+            try:
+                async with self.session_factory() as session:
+                    async with session.begin():
+                        await session.execute(insert(ChatHistory), [entry._asdict() for entry in self.flushing])
+                        if HISTORY_TRIM_MODE == 'inline':
+                            for user_id in {entry.user_id for entry in self.flushing}:
+                                await self._cleanup_old_history(session, user_id)
+                
+                flushed = len(self.flushing)
+                self.flushes += 1
+                self.rows_flushed += flushed
+                self.log_operation("flush_chat_history", f"Rows: {flushed}")
+                return flushed
+                
+            except Exception as e:
+                # Keep the rows, ahead of anything buffered meanwhile, for the next attempt
+                self.write_buffer = self.flushing + self.write_buffer
+                self._drop_overflow()
+                self.log_error("flush_chat_history", e)
+                return 0
+            finally:
+                self.flushing = []
+
+    def _drop_overflow(self):
+        """Drop the oldest buffered turns beyond HISTORY_BUFFER_MAX_ROWS so an outage cannot grow the buffer without bound"""
+        overflow = len(self.write_buffer) - HISTORY_BUFFER_MAX_ROWS
+        if overflow <= 0:
+            return
+        del self.write_buffer[:overflow]
+        self.rows_dropped += overflow
+        self.log_operation("drop_overflow", f"Dropped: {overflow}, Total dropped: {self.rows_dropped}")
+
+    async def _flush_loop(self, interval):
+        """Flush buffered turns every `interval` seconds, or sooner once the buffer is full"""
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_wakeup.clear()
+            await self.flush_chat_history()
+
+    def start_flusher(self, interval_ms=HISTORY_FLUSH_INTERVAL_MS):
+        """Start the background flusher when HISTORY_WRITE_MODE is 'write_behind'"""
+        if HISTORY_WRITE_MODE != 'write_behind':
+            return
+        if self.flush_task and not self.flush_task.done():
+            return
+        self.flush_wakeup = asyncio.Event()
+        self.flush_task = asyncio.create_task(self._flush_loop(interval_ms / 1000))
+        self.log_operation("start_flusher", f"Interval: {interval_ms}ms")
+
+    async def stop_flusher(self):
+        """Cancel the background flusher and write out anything still buffered"""
+        if self.flush_task:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+        await self.flush_chat_history()
+
+    def _pending_entries(self, user_id):
+        """Buffered turns for a user that may not be in the database yet (newest first)"""
+        return [entry for entry in reversed(self.flushing + self.write_buffer) if entry.user_id == user_id]
+
+    async def _cleanup_old_history(self, session, user_id):
+        """Clean up old chat history entries beyond HISTORY_STORED_TURNS within the caller's transaction"""
+        result = await session.execute(self._trim_statement(user_id))
+        if result.rowcount:
+            self.log_operation("cleanup_history", f"Removed {result.rowcount} old entries for user {user_id}")
+
+    async def compact_history(self, batch_size=HISTORY_COMPACTION_BATCH_SIZE):
+        """Trim every user's history to HISTORY_STORED_TURNS, one short transaction per batch"""
+        removed = 0
+        try:
+            while True:
+                async with self.session_factory() as session:
+                    async with session.begin():
+                        result = await session.execute(self._compaction_statement(batch_size=batch_size))
+                removed += result.rowcount
+                if result.rowcount < batch_size:
+                    break
+                # Let other database work interleave between batches
+                await asyncio.sleep(0)
+            
+            if removed:
+                self.log_operation("compact_history", f"Removed {removed} old entries")
+            return removed
+            
+        except Exception as e:
+            self.log_error("compact_history", e)
+            return removed
+
+    async def _compaction_loop(self, interval):
+        """Run history compaction every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.compact_history()
+
+    def start_compaction(self, interval=HISTORY_COMPACTION_INTERVAL):
+        """Start background compaction when HISTORY_TRIM_MODE is 'background'"""
+        if HISTORY_TRIM_MODE != 'background':
+            return
+        if self.compaction_task and not self.compaction_task.done():
+            return
+        self.compaction_task = asyncio.create_task(self._compaction_loop(interval))
+        self.log_operation("start_compaction", f"Interval: {interval}s")
+
+    async def stop_compaction(self):
+        """Cancel the background compaction task"""
+        if self.compaction_task:
+            self.compaction_task.cancel()
+            try:
+                await self.compaction_task
+            except asyncio.CancelledError:
+                pass
+            self.compaction_task = None
+
+    async def get_chat_history(self, user_id, limit=MAX_HISTORY_LENGTH):
+        """Get chat history for a user"""
+        cached = self.history_cache.get(user_id, limit)
+        if cached is not None:
+            return cached
+        
+        try:
+            # Read every stored turn on a miss, so the cached buffer serves any later limit
+            stored_limit = max(limit, self.history_cache.turns_per_user)
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(ChatHistory)
+                    .filter(ChatHistory.user_id == user_id)
+                    .order_by(ChatHistory.timestamp.desc())
+                    .limit(stored_limit)
+                )
+                history = self._to_entries(result.scalars().all())
+            
+            # Merge turns still waiting in the write-behind buffer; a flush may land mid-read
+            pending = self._pending_entries(user_id)
+            if pending:
+                stored = set(history)
+                history = [entry for entry in pending if entry not in stored] + history
+                history.sort(key=lambda entry: entry.timestamp, reverse=True)
+                history = history[:stored_limit]
+            self.history_cache.load(user_id, history)
+            history = history[:limit]
+            
+            self.log_operation("get_chat_history", f"User: {user_id}, Entries: {len(history)}")
+            return history
+            
+        except Exception as e:
+            self.log_error("get_chat_history", e)
+            return []
+
+    async def get_chat_history_page(self, after_id=0, limit=1000, since=None):
+        """Get up to `limit` stored turns of all users with ids above after_id (and newer than since), oldest first"""
+        try:
+            query = select(ChatHistory).filter(ChatHistory.id > after_id)
+            if since is not None:
+                query = query.filter(ChatHistory.timestamp > since)
+            async with self.session_factory() as session:
+                result = await session.execute(query.order_by(ChatHistory.id).limit(limit))
+                rows = result.scalars().all()
+            
+            self.log_operation("get_chat_history_page", f"After: {after_id}, Rows: {len(rows)}")
+            return rows
+            
+        except Exception as e:
+            self.log_error("get_chat_history_page", e)
+            return []
+
+    async def get_summary(self, user_id):
+        """Get the rolling conversation summary for a user"""
+        cached = self.summary_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(ConversationSummary.summary, ConversationSummary.summarized_until)
+                    .filter(ConversationSummary.user_id == user_id)
+                )
+                row = result.first()
+            
+            entry = SummaryEntry(row.summary, row.summarized_until) if row else SummaryEntry("", None)
+            self.summary_cache.put(user_id, entry)
+            self.log_operation("get_summary", f"User: {user_id}, Until: {entry.summarized_until}")
+            return entry
+            
+        except Exception as e:
+            self.log_error("get_summary", e)
+            return SummaryEntry("", None)
+
+    async def save_summary(self, user_id, summary, summarized_until):
+        """Create or update the rolling conversation summary for a user"""
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    result = await session.execute(
+                        select(ConversationSummary).filter(ConversationSummary.user_id == user_id)
+                    )
+                    record = result.scalars().first()
+                    
+                    if record:
+                        record.summary = summary
+                        record.summarized_until = summarized_until
+                        record.updated_at = datetime.utcnow()
+                    else:
+                        session.add(ConversationSummary(
+                            user_id=user_id,
+                            summary=summary,
+                            summarized_until=summarized_until
+                        ))
+            self.summary_cache.put(user_id, SummaryEntry(summary, summarized_until))
+            
+            self.log_operation("save_summary", f"User: {user_id}, Until: {summarized_until}")
+            
+        except Exception as e:
+            self.log_error("save_summary", e)
+            raise
+
+    async def set_channel(self, guild_id, channel_id):
+        """Set or update the primary channel for a guild"""
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    result = await session.execute(
+                        select(ChannelConfig).filter(ChannelConfig.guild_id == guild_id)
+                    )
+                    config = result.scalars().first()
+                    
+                    if config:
+                        config.channel_id = channel_id
+                        config.updated_at = datetime.utcnow()
+                    else:
+                        session.add(ChannelConfig(
+                            guild_id=guild_id,
+                            channel_id=channel_id
+                        ))
+            self.hot_cache.set_channel(guild_id, channel_id)
+            
+            self.log_operation("set_channel", f"Guild: {guild_id}, Channel: {channel_id}")
+            
+        except Exception as e:
+            self.log_error("set_channel", e)
+            raise
+
+    async def get_channel(self, guild_id):
+        """Get the primary channel for a guild"""
+        if self.hot_cache.loaded:
+            return self.hot_cache.get_channel(guild_id)
+        
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(ChannelConfig.channel_id).filter(ChannelConfig.guild_id == guild_id)
+                )
+                channel_id = result.scalars().first()
+            
+            self.log_operation("get_channel", f"Guild: {guild_id}, Channel: {channel_id}")
+            return channel_id
+            
+        except Exception as e:
+            self.log_error("get_channel", e)
+            return None
+
+    async def set_response_cache(self, guild_id, channel_id, enabled):
+        """Turn the response cache on or off for a channel; None restores the default"""
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    result = await session.execute(
+                        select(ChannelSettings).filter(ChannelSettings.channel_id == channel_id)
+                    )
+                    settings = result.scalars().first()
+                    
+                    if settings:
+                        settings.response_cache = enabled
+                        settings.updated_at = datetime.utcnow()
+                    else:
+                        session.add(ChannelSettings(
+                            channel_id=channel_id,
+                            guild_id=guild_id,
+                            response_cache=enabled
+                        ))
+            self.hot_cache.set_response_cache(channel_id, enabled)
+            
+            self.log_operation("set_response_cache", f"Channel: {channel_id}, Enabled: {enabled}")
+            
+        except Exception as e:
+            self.log_error("set_response_cache", e)
+            raise
+
+    async def set_context_mode(self, guild_id, channel_id, mode):
+        """Set a channel's context mode ('user' or 'channel'); None restores the default"""
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    result = await session.execute(
+                        select(ChannelSettings).filter(ChannelSettings.channel_id == channel_id)
+                    )
+                    settings = result.scalars().first()
+                    
+                    if settings:
+                        settings.context_mode = mode
+                        settings.updated_at = datetime.utcnow()
+                    else:
+                        session.add(ChannelSettings(
+                            channel_id=channel_id,
+                            guild_id=guild_id,
+                            context_mode=mode
+                        ))
+            self.hot_cache.set_context_mode(channel_id, mode)
+            
+            self.log_operation("set_context_mode", f"Channel: {channel_id}, Mode: {mode}")
+            
+        except Exception as e:
+            self.log_error("set_context_mode", e)
+            raise
+
+    async def get_channel_messages(self, channel_id, limit):
+        """Get a channel's newest `limit` stored messages as ChannelMessageEntry tuples, oldest first"""
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(
+                        ChannelMessage.channel_id, ChannelMessage.message_id, ChannelMessage.author_id,
+                        ChannelMessage.author_name, ChannelMessage.content, ChannelMessage.is_self,
+                        ChannelMessage.timestamp
+                    )
+                    .filter(ChannelMessage.channel_id == channel_id)
+                    .order_by(ChannelMessage.timestamp.desc())
+                    .limit(limit)
+                )
+                messages = [ChannelMessageEntry(*row) for row in reversed(result.all())]
+            
+            self.log_operation("get_channel_messages", f"Channel: {channel_id}, Messages: {len(messages)}")
+            return messages
+            
+        except Exception as e:
+            self.log_error("get_channel_messages", e)
+            return []
+
+    async def save_channel_messages(self, entries, keep):
+        """Insert channel messages with one executemany and trim each channel to its newest `keep`; returns success"""
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    await session.execute(insert(ChannelMessage), [entry._asdict() for entry in entries])
+                    for channel_id in {entry.channel_id for entry in entries}:
+                        newest = (
+                            select(ChannelMessage.id)
+                            .filter(ChannelMessage.channel_id == channel_id)
+                            .order_by(ChannelMessage.timestamp.desc())
+                            .limit(keep)
+                        )
+                        await session.execute(
+                            delete(ChannelMessage)
+                            .where(ChannelMessage.channel_id == channel_id)
+                            .where(ChannelMessage.id.not_in(newest))
+                        )
+            
+            self.log_operation("save_channel_messages", f"Messages: {len(entries)}")
+            return True
+            
+        except Exception as e:
+            self.log_error("save_channel_messages", e)
+            return False
+
+    async def get_guild_personas(self):
+        """Get every per-guild persona override as a {guild_id: prompt} dict"""
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(select(GuildPersona.guild_id, GuildPersona.prompt))
+                overrides = dict(result.all())
+            
+            self.log_operation("get_guild_personas", f"Overrides: {len(overrides)}")
+            return overrides
+            
+        except Exception as e:
+            self.log_error("get_guild_personas", e)
+            return {}
+
+    async def set_guild_persona(self, guild_id, prompt, modified_by):
+        """Set a guild's persona override, or remove it when prompt is None"""
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    if prompt is None:
+                        await session.execute(delete(GuildPersona).where(GuildPersona.guild_id == guild_id))
+                    else:
+                        result = await session.execute(
+                            select(GuildPersona).filter(GuildPersona.guild_id == guild_id)
+                        )
+                        persona = result.scalars().first()
+                        
+                        if persona:
+                            persona.prompt = prompt
+                            persona.modified_by = modified_by
+                            persona.updated_at = datetime.utcnow()
+                        else:
+                            session.add(GuildPersona(
+                                guild_id=guild_id,
+                                prompt=prompt,
+                                modified_by=modified_by
+                            ))
+            
+            self.log_operation("set_guild_persona", f"Guild: {guild_id}, Cleared: {prompt is None}")
+            
+        except Exception as e:
+            self.log_error("set_guild_persona", e)
+            raise
+
+    async def get_cached_response(self, cache_key, ttl):
+        """Get a cached response and its creation time, or None if missing or older than ttl seconds"""
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(ResponseCacheEntry.response, ResponseCacheEntry.created_at)
+                    .filter(ResponseCacheEntry.cache_key == cache_key)
+                    .filter(ResponseCacheEntry.created_at >= datetime.utcnow() - timedelta(seconds=ttl))
+                )
+                row = result.first()
+            
+            self.log_operation("get_cached_response", f"Key: {cache_key[:12]}, Hit: {row is not None}")
+            return row
+            
+        except Exception as e:
+            self.log_error("get_cached_response", e)
+            return None
+
+    async def save_cached_response(self, cache_key, response):
+        """Create or refresh a cached response"""
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    result = await session.execute(
+                        select(ResponseCacheEntry).filter(ResponseCacheEntry.cache_key == cache_key)
+                    )
+                    entry = result.scalars().first()
+                    
+                    if entry:
+                        entry.response = response
+                        entry.created_at = datetime.utcnow()
+                    else:
+                        session.add(ResponseCacheEntry(cache_key=cache_key, response=response))
+            
+            self.log_operation("save_cached_response", f"Key: {cache_key[:12]}")
+            
+        except Exception as e:
+            self.log_error("save_cached_response", e)
+
+    async def prune_response_cache(self, ttl, max_entries):
+        """Delete expired cached responses and all but the newest max_entries"""
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    expired = await session.execute(
+                        delete(ResponseCacheEntry)
+                        .where(ResponseCacheEntry.created_at < datetime.utcnow() - timedelta(seconds=ttl))
+                    )
+                    newest = (
+                        select(ResponseCacheEntry.id)
+                        .order_by(ResponseCacheEntry.created_at.desc())
+                        .limit(max_entries)
+                    )
+                    overflow = await session.execute(
+                        delete(ResponseCacheEntry).where(ResponseCacheEntry.id.not_in(newest))
+                    )
+            
+            removed = expired.rowcount + overflow.rowcount
+            self.log_operation("prune_response_cache", f"Removed: {removed}")
+            return removed
+            
+        except Exception as e:
+            self.log_error("prune_response_cache", e)
+            return 0
+
+    async def clear_response_cache(self):
+        """Delete every cached response"""
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    result = await session.execute(delete(ResponseCacheEntry))
+            self.log_operation("clear_response_cache", f"Removed: {result.rowcount}")
+            return result.rowcount
+            
+        except Exception as e:
+            self.log_error("clear_response_cache", e)
+            raise
+
+    async def load_key_health(self):
+        """Get the saved health of every API key as a {key_id: fields} dict"""
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(select(ApiKeyHealth))
+                health = {
+                    row.key_id: {
+                        column: getattr(row, column) for column in KEY_HEALTH_COLUMNS
+                    } for row in result.scalars().all()
+                }
+            
+            self.log_operation("load_key_health", f"Keys: {len(health)}")
+            return health
+            
+        except Exception as e:
+            self.log_error("load_key_health", e)
+            return {}
+
+    async def save_key_health(self, health):
+        """Create or update the saved health of each API key in {key_id: fields}; returns whether it was saved.
+
+        KEY_HEALTH_COUNTERS are added to the stored values in SQL, so workers sharing the rows do not
+        overwrite each other's counts.
+        """
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    for key_id, fields in health.items():
+                        values = {column: fields[column] for column in KEY_HEALTH_COLUMNS}
+                        increments = {
+                            column: getattr(ApiKeyHealth, column) + values[column] for column in KEY_HEALTH_COUNTERS
+                        }
+                        result = await session.execute(
+                            update(ApiKeyHealth)
+                            .where(ApiKeyHealth.key_id == key_id)
+                            .values(**{**values, **increments}, updated_at=datetime.utcnow())
+                        )
+                        if result.rowcount == 0:
+                            session.add(ApiKeyHealth(key_id=key_id, **values))
+            
+            self.log_operation("save_key_health", f"Keys: {len(health)}")
+            return True
+            
+        except Exception as e:
+            self.log_error("save_key_health", e)
+            return False
+
+    async def update_temperature(self, temperature):
+        """Update the global temperature setting"""
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    result = await session.execute(select(BotSettings))
+                    settings = result.scalars().first()
+                    
+                    if not settings:
+                        settings = BotSettings()
+                        session.add(settings)
+                    
+                    settings.temperature = temperature
+                    settings.updated_at = datetime.utcnow()
+            self.hot_cache.temperature = temperature
+            
+            self.log_operation("update_temperature", f"New temperature: {temperature}")
+            
+        except Exception as e:
+            self.log_error("update_temperature", e)
+            raise
+
+    async def get_settings(self):
+        """Get global bot settings"""
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    result = await session.execute(select(BotSettings))
+                    settings = result.scalars().first()
+                    
+                    if not settings:
+                        settings = BotSettings()
+                        session.add(settings)
+            
+            self.log_operation("get_settings", f"Temperature: {settings.temperature}")
+            return settings
+            
+        except Exception as e:
+            self.log_error("get_settings", e)
+            return BotSettings()
+
+    async def set_user_access(self, user_id, is_blacklisted, modified_by, reason=None):
+        """Set user access (blacklist/whitelist)"""
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    result = await session.execute(
+                        select(UserAccess).filter(UserAccess.user_id == user_id)
+                    )
+                    user_access = result.scalars().first()
+                    
+                    if user_access:
+                        user_access.is_blacklisted = is_blacklisted
+                        user_access.modified_at = datetime.utcnow()
+                        user_access.modified_by = modified_by
+                        user_access.reason = reason
+                    else:
+                        session.add(UserAccess(
+                            user_id=user_id,
+                            is_blacklisted=is_blacklisted,
+                            modified_by=modified_by,
+                            reason=reason
+                        ))
+            self.hot_cache.set_blacklisted(user_id, is_blacklisted)
+            
+            status = "blacklisted" if is_blacklisted else "whitelisted"
+            self.log_operation("set_user_access", f"User: {user_id} {status}")
+            
+        except Exception as e:
+            self.log_error("set_user_access", e)
+            raise
+
+    async def is_user_blacklisted(self, user_id):
+        """Check if a user is blacklisted"""
+        if self.hot_cache.loaded:
+            return self.hot_cache.is_blacklisted(user_id)
+        
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(UserAccess.is_blacklisted).filter(UserAccess.user_id == user_id)
+                )
+                is_blacklisted = bool(result.scalars().first())
+            
+            self.log_operation("check_blacklist", f"User: {user_id}, Blacklisted: {is_blacklisted}")
+            return is_blacklisted
+            
+        except Exception as e:
+            self.log_error("check_blacklist", e)
+            return False
+
+    async def get_database_stats(self):
+        """Get database statistics"""
+        try:
+            async with self.session_factory() as session:
+                stats = {
+                    "total_messages": await session.scalar(select(func.count(ChatHistory.id))),
+                    "total_users": await session.scalar(select(func.count(ChatHistory.user_id.distinct()))),
+                    "blacklisted_users": await session.scalar(
+                        select(func.count(UserAccess.id)).filter(UserAccess.is_blacklisted == True)
+                    ),
+                    "configured_channels": await session.scalar(select(func.count(ChannelConfig.id))),
+                    "history_cache": self.history_cache.stats(),
+                    "write_buffer": self.write_stats(),
+                    "hot_cache": self.hot_cache.stats(),
+                    "uptime": str(datetime.utcnow() - self.startup_time)
+                }
+            return stats
+            
+        except Exception as e:
+            self.log_error("get_stats", e)
+            return {}
+
+    def write_stats(self):
+        """Get write-behind buffer statistics"""
+        return {
+            "mode": HISTORY_WRITE_MODE,
+            "buffered_rows": len(self.write_buffer) + len(self.flushing),
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "rows_dropped": self.rows_dropped
+        }
+
+    async def cleanup(self):
+        """Flush buffered history and dispose of the connection pool"""
+        try:
+            await self.stop_flusher()
+            await self.stop_compaction()
+            await self.stop_hot_cache_refresh()
+            await self.engine.dispose()
+            self.log_operation("cleanup", "Database connection pool disposed")
+        except Exception as e:
+            self.log_error("cleanup", e)
+
 if __name__ == "__main__":
     # Test database operations
     db = DatabaseHandler()
@@ -0,0 +1,234 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from config import (
+    GEMINI_RPM_LIMIT, GEMINI_TPM_LIMIT, GEMINI_RPD_LIMIT, KEY_BACKOFF_BASE, KEY_BACKOFF_MAX,
+    KEY_ERROR_THRESHOLD, KEY_ERROR_COOLDOWN
+)
+from resilience import CircuitBreaker
+
+# Length of the sliding rate-limit window, in seconds
+RATE_WINDOW = 60.0
+
+def seconds_until_midnight(now):
+    """Seconds from a UTC datetime until the next UTC midnight, when daily quotas reset"""
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return (midnight - now).total_seconds()
+
+class KeyState:
+    """Sliding-window usage and backoff state for one API key"""
+    def __init__(self, key):
+        self.key = key
+        self.requests = deque()  # monotonic timestamps of dispatched requests
+        self.tokens = deque()  # (monotonic timestamp, token count)
+        self.token_total = 0
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+        self.last_dispatch = 0.0
+        self.quota_date = None  # UTC date (YYYY-MM-DD) the daily counters below belong to
+        self.daily_requests = 0
+        self.daily_tokens = 0
+        self.breaker = CircuitBreaker(f"key ...{key[-4:]}", KEY_ERROR_THRESHOLD, KEY_ERROR_COOLDOWN)
+
+    def prune(self, now):
+        """Drop usage older than the rate window"""
+        cutoff = now - RATE_WINDOW
+        while self.requests and self.requests[0] <= cutoff:
+            self.requests.popleft()
+        while self.tokens and self.tokens[0][0] <= cutoff:
+            self.token_total -= self.tokens.popleft()[1]
+
+class KeyScheduler:
+    """Dispatches each request to the API key with the most rate-limit headroom"""
+    def __init__(self, keys, rpm_limit=GEMINI_RPM_LIMIT, tpm_limit=GEMINI_TPM_LIMIT, rpd_limit=GEMINI_RPD_LIMIT):
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.rpd_limit = rpd_limit
+        self.states = {key: KeyState(key) for key in keys}
+
+    def headroom(self, key, now=None):
+        """Fraction of the tighter of the RPM/TPM limits still available for a key (0.0 to 1.0)"""
+        now = now or time.monotonic()
+        state = self.states[key]
+        state.prune(now)
+        request_room = 1 - len(state.requests) / self.rpm_limit
+        token_room = 1 - state.token_total / self.tpm_limit
+        return max(0.0, min(request_room, token_room))
+
+    def is_available(self, key, now=None):
+        now = now or time.monotonic()
+        state = self.states[key]
+        return state.cooldown_until <= now and state.breaker.available(now) and self.headroom(key, now) > 0
+
+    def try_acquire(self, estimated_tokens=0, exclude=()):
+        """Reserve a slot on the key with the most headroom; None if every key is limited or cooling down"""
+        now = time.monotonic()
+        best = None
+        best_rank = None
+        for key, state in self.states.items():
+            if key in exclude or state.cooldown_until > now or not state.breaker.available(now):
+                continue
+            room = self.headroom(key, now)
+            if room <= 0:
+                continue
+            # Most headroom wins; ties go to the key that has waited longest
+            rank = (room, -state.last_dispatch)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = key, rank
+        
+        if best is not None:
+            state = self.states[best]
+            state.breaker.allow(now)
+            state.requests.append(now)
+            state.last_dispatch = now
+            self.record_tokens(best, estimated_tokens, now)
+        return best
+
+    async def acquire(self, estimated_tokens=0, exclude=(), timeout=0.0):
+        """Like try_acquire, but wait up to `timeout` seconds for a key to free up"""
+        deadline = time.monotonic() + timeout
+        while True:
+            key = await self.run(self.try_acquire, estimated_tokens, exclude)
+            if key is not None:
+                return key
+            wait = await self.run(self.next_available_in, exclude)
+            if wait is None or time.monotonic() + wait > deadline:
+                return None
+            await asyncio.sleep(wait)
+
+    async def run(self, method, *args):
+        """Call one of this scheduler's methods from async code; in-process state is updated inline"""
+        return method(*args)
+
+    def next_available_in(self, exclude=()):
+        """Seconds until some key regains headroom, or None if no key is eligible"""
+        now = time.monotonic()
+        waits = []
+        for key, state in self.states.items():
+            if key in exclude:
+                continue
+            state.prune(now)
+            ready_at = max(state.cooldown_until, now + state.breaker.retry_in(now))
+            if len(state.requests) >= self.rpm_limit:
+                ready_at = max(ready_at, state.requests[0] + RATE_WINDOW)
+            if state.token_total >= self.tpm_limit and state.tokens:
+                ready_at = max(ready_at, state.tokens[0][0] + RATE_WINDOW)
+            waits.append(max(0.0, ready_at - now))
+        return min(waits) if waits else None
+
+    def record_tokens(self, key, tokens, now=None):
+        """Count tokens against a key's per-minute budget"""
+        if tokens:
+            state = self.states[key]
+            state.tokens.append((now or time.monotonic(), tokens))
+            state.token_total += tokens
+
+    def record_success(self, key):
+        state = self.states[key]
+        state.consecutive_failures = 0
+        state.breaker.record_success()
+
+    def record_completion(self, key, tokens):
+        """Record a request the key served and the tokens its reply used; True if it spent the daily quota"""
+        self.record_success(key)
+        self.record_tokens(key, tokens)
+        return self.record_daily_usage(key, tokens)
+
+    def record_daily_usage(self, key, tokens):
+        """Count a request against the key's daily quota, resting it until UTC midnight once spent"""
+        state = self.states[key]
+        now = datetime.utcnow()
+        today = now.date().isoformat()
+        if state.quota_date != today:
+            state.quota_date = today
+            state.daily_requests = 0
+            state.daily_tokens = 0
+        state.daily_requests += 1
+        state.daily_tokens += tokens
+        if self.rpd_limit and state.daily_requests >= self.rpd_limit:
+            self.cool_down(key, seconds_until_midnight(now))
+            return True
+        return False
+
+    def daily_usage(self, key):
+        """Requests and tokens counted against the key's quota today (UTC)"""
+        state = self.states[key]
+        if state.quota_date != datetime.utcnow().date().isoformat():
+            return {"daily_requests": 0, "daily_tokens": 0}
+        return {"daily_requests": state.daily_requests, "daily_tokens": state.daily_tokens}
+
+    def record_failure(self, key, retry_after=None, breaker_failure=True, trip=False):
+        """Back off a key (retry_after, else exponential) and feed or trip its circuit breaker"""
+        state = self.states[key]
+        state.consecutive_failures += 1
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            delay = min(KEY_BACKOFF_MAX, KEY_BACKOFF_BASE * 2 ** (state.consecutive_failures - 1))
+        state.cooldown_until = max(state.cooldown_until, time.monotonic() + delay)
+        
+        if trip:
+            state.breaker.trip()
+        elif breaker_failure:
+            state.breaker.record_failure()
+        return delay
+
+    def cool_down(self, key, seconds):
+        """Keep a key out of rotation for at least `seconds`"""
+        state = self.states[key]
+        state.cooldown_until = max(state.cooldown_until, time.monotonic() + seconds)
+
+    def export_health(self, key):
+        """Backoff and breaker state for one key, with times as wall-clock epoch seconds"""
+        state = self.states[key]
+        offset = time.time() - time.monotonic()
+        return {
+            "cooldown_until": state.cooldown_until + offset if state.cooldown_until else None,
+            "consecutive_failures": state.consecutive_failures,
+            "breaker_state": state.breaker.state,
+            "breaker_failures": state.breaker.failures,
+            "breaker_opened_at": state.breaker.opened_at + offset if state.breaker.opened_at else None,
+            "quota_date": state.quota_date,
+            "daily_requests": state.daily_requests,
+            "daily_tokens": state.daily_tokens
+        }
+
+    def restore_health(self, key, health):
+        """Apply state saved by export_health, e.g. after a restart"""
+        state = self.states[key]
+        offset = time.time() - time.monotonic()
+        if health.get("cooldown_until"):
+            state.cooldown_until = max(state.cooldown_until, health["cooldown_until"] - offset)
+        state.consecutive_failures = max(state.consecutive_failures, health.get("consecutive_failures") or 0)
+        state.breaker.failures = max(state.breaker.failures, health.get("breaker_failures") or 0)
+        if health.get("breaker_state", CircuitBreaker.CLOSED) != CircuitBreaker.CLOSED and health.get("breaker_opened_at"):
+            # A probe in flight before the restart never finished; wait out the open period again
+            state.breaker.state = CircuitBreaker.OPEN
+            state.breaker.opened_at = health["breaker_opened_at"] - offset
+            state.breaker.probe_started_at = None
+        now = datetime.utcnow()
+        if health.get("quota_date") == now.date().isoformat():
+            # Other workers may have restored (and added to) the same counters already
+            if state.quota_date != health["quota_date"]:
+                state.quota_date, state.daily_requests, state.daily_tokens = health["quota_date"], 0, 0
+            state.daily_requests = max(state.daily_requests, health.get("daily_requests") or 0)
+            state.daily_tokens = max(state.daily_tokens, health.get("daily_tokens") or 0)
+            if self.rpd_limit and state.daily_requests >= self.rpd_limit:
+                self.cool_down(key, seconds_until_midnight(now))
+
+    def stats(self, key):
+        """Get usage statistics for one key"""
+        now = time.monotonic()
+        state = self.states[key]
+        state.prune(now)
+        return {
+            "requests_last_minute": len(state.requests),
+            "tokens_last_minute": state.token_total,
+            "headroom": f"{self.headroom(key, now) * 100:.0f}%",
+            "cooldown_remaining": f"{max(0.0, state.cooldown_until - now, state.breaker.retry_in(now)):.0f}s",
+            "breaker": state.breaker.state
+        }
+
+    def close(self):
+        """Release the scheduler's resources; in-process state holds none"""
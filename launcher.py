@@ -0,0 +1,141 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from datetime import datetime
+import discord
+
+# config.py reads SHARD_IDS when it is first imported, and a spawned worker re-imports this module
+# before run_worker sets it; so config, and modules that import it, are only imported inside functions
+
+# Restart delays for crashed workers; a worker that ran this long is considered healthy again
+RESTART_DELAY = 5
+RESTART_DELAY_MAX = 120
+HEALTHY_RUNTIME = 300
+# Seconds a stopping worker gets to flush and disconnect after draining, before it is killed
+SHUTDOWN_GRACE = 30
+
+def log_info(message):
+    """Log info messages with timestamp"""
+    timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"[{timestamp}] SUPERVISOR: {message}")
+
+async def fetch_recommended_shards(token):
+    """Ask Discord how many shards the bot should run"""
+    client = discord.Client(intents=discord.Intents.none())
+    try:
+        await client.login(token)
+        shards, _ = await client.http.get_bot_gateway()
+        return shards
+    finally:
+        await client.close()
+
+def assign_shards(shard_count, workers):
+    """Spread shard ids round-robin over the workers, dropping workers left without shards"""
+    assignments = [list(range(shard_count))[index::workers] for index in range(workers)]
+    return [shards for shards in assignments if shards]
+
+def run_worker(shard_ids, shard_count):
+    """Entry point of a worker process: run the bot for the given shards"""
+    # Set before config.py is imported in this (spawned) process
+    os.environ["SHARD_IDS"] = ",".join(str(shard) for shard in shard_ids)
+    os.environ["SHARD_COUNT"] = str(shard_count)
+    import config
+    if config.SHARD_IDS != list(shard_ids) or config.SHARD_COUNT != shard_count:
+        # Without its shards a worker would serve every guild alongside the others
+        raise RuntimeError(
+            f"Worker for shards {shard_ids} loaded config with SHARD_IDS={config.SHARD_IDS}; "
+            "config was imported before the shard assignment was set"
+        )
+    import bot
+    bot.main()
+
+class Supervisor:
+    """Starts one process per shard group, restarts crashed workers and stops them on SIGTERM/SIGINT"""
+    def __init__(self, shard_count, workers, stop_timeout):
+        self.shard_count = shard_count
+        self.stop_timeout = stop_timeout  # seconds a worker gets to exit before it is killed
+        self.assignments = assign_shards(shard_count, workers)
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = {}  # worker index -> Process
+        self.started_at = {}
+        self.restart_delays = {}
+        self.stopping = False
+
+    def start_worker(self, index):
+        shard_ids = self.assignments[index]
+        process = self.context.Process(
+            target=run_worker, args=(shard_ids, self.shard_count), name=f"gembot-worker-{index}"
+        )
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+        log_info(f"Worker {index} (pid {process.pid}) started for shards {shard_ids}")
+
+    def stop(self, *_):
+        """Ask every worker to shut down; each drains its replies and flushes its state on SIGTERM"""
+        if self.stopping:
+            return
+        self.stopping = True
+        log_info("Stopping workers...")
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+
+    def run(self):
+        """Start all workers and supervise them until stopped"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(len(self.assignments)):
+            self.start_worker(index)
+
+        pending_restarts = {}  # worker index -> monotonic time to restart at
+        while not self.stopping:
+            now = time.monotonic()
+            for index, process in self.processes.items():
+                if process.is_alive() or index in pending_restarts:
+                    continue
+                # Back off workers that keep crashing soon after starting
+                if now - self.started_at[index] >= HEALTHY_RUNTIME:
+                    self.restart_delays[index] = RESTART_DELAY
+                delay = self.restart_delays.get(index, RESTART_DELAY)
+                self.restart_delays[index] = min(RESTART_DELAY_MAX, delay * 2)
+                pending_restarts[index] = now + delay
+                log_info(f"Worker {index} exited with code {process.exitcode}; restarting in {delay}s")
+
+            for index, restart_at in list(pending_restarts.items()):
+                if now >= restart_at and not self.stopping:
+                    del pending_restarts[index]
+                    self.start_worker(index)
+            time.sleep(1)
+
+        for process in self.processes.values():
+            process.join(timeout=self.stop_timeout)
+            if process.is_alive():
+                process.kill()
+        log_info("All workers stopped")
+
+def main():
+    """Prepare the database and shared key store, then run the sharded workers"""
+    from config import DISCORD_TOKEN, SHARD_COUNT, WORKER_PROCESSES, SHARED_STATE_PATH, SHUTDOWN_DRAIN_TIMEOUT
+    from models import init_db
+    from shared_state import SharedKeyStore
+
+    shard_count = SHARD_COUNT or asyncio.run(fetch_recommended_shards(DISCORD_TOKEN))
+    log_info(f"Running {shard_count} shards across up to {WORKER_PROCESSES} workers")
+    if WORKER_PROCESSES > 1 and not SHARED_STATE_PATH:
+        log_info("Warning: SHARED_STATE_PATH is not set; each worker will use its own key budget")
+
+    # Migrate once here instead of racing in every worker
+    init_db()
+    if SHARED_STATE_PATH:
+        # Timestamps in the store are only valid for this boot
+        store = SharedKeyStore(SHARED_STATE_PATH)
+        store.reset()
+        store.close()
+
+    Supervisor(shard_count, WORKER_PROCESSES, SHUTDOWN_DRAIN_TIMEOUT + SHUTDOWN_GRACE).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import asyncio
+import signal
+import time
+from datetime import datetime
+from config import SHUTDOWN_DRAIN_TIMEOUT
+
+class LifecycleManager:
+    """Runs the bot's shutdown once: stop accepting messages, drain work in flight, then flush and close.
+
+    Drain callbacks take the seconds left before the shared drain deadline; shutdown steps run in the
+    order they were added, and a failing step is logged without stopping the ones after it.
+    """
+    def __init__(self, drain_timeout=SHUTDOWN_DRAIN_TIMEOUT):
+        self.drain_timeout = drain_timeout
+        self.accepting = True
+        self.drains = []  # (name, async callable taking the remaining timeout)
+        self.steps = []  # (name, async or plain callable)
+        self.shutdown_task = None
+
+    def log_info(self, message):
+        """Log info messages with timestamp"""
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        print(f"[{timestamp}] SHUTDOWN: {message}")
+
+    def add_drain(self, name, drain):
+        self.drains.append((name, drain))
+
+    def add_step(self, name, step):
+        self.steps.append((name, step))
+
+    def install_signal_handlers(self, stop):
+        """Call `stop` (an async callable, usually bot.close) on the first SIGTERM or SIGINT"""
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(signum, self.handle_signal, signum, stop)
+            except NotImplementedError:
+                # Windows event loops have no add_signal_handler
+                signal.signal(signum, lambda received, frame: loop.call_soon_threadsafe(self.handle_signal, received, stop))
+
+    def handle_signal(self, signum, stop):
+        if not self.accepting:
+            self.log_info(f"Received {signal.Signals(signum).name} again; already shutting down")
+            return
+        self.log_info(f"Received {signal.Signals(signum).name}; shutting down")
+        self.accepting = False
+        asyncio.ensure_future(stop())
+
+    async def shutdown(self):
+        """Drain and run the shutdown steps; later and concurrent calls wait for the same run"""
+        if self.shutdown_task is None:
+            self.shutdown_task = asyncio.ensure_future(self._shutdown())
+        await asyncio.shield(self.shutdown_task)
+
+    async def _shutdown(self):
+        started = time.monotonic()
+        self.accepting = False
+        deadline = started + self.drain_timeout
+        for name, drain in self.drains:
+            try:
+                await drain(max(0.0, deadline - time.monotonic()))
+            except Exception as e:
+                self.log_info(f"Draining {name} failed: {str(e)}")
+        self.log_info(f"Drained in {time.monotonic() - started:.1f}s")
+
+        for name, step in self.steps:
+            try:
+                result = step()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                self.log_info(f"{name} failed: {str(e)}")
+        self.log_info(f"Shutdown complete in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime
+import numpy as np
+from config import MEMORY_DIR, MEMORY_DIMENSIONS, MEMORY_TOP_K, MEMORY_MIN_SCORE, MEMORY_FLUSH_INTERVAL
+
+WORD_PATTERN = re.compile(r"\w+")
+# Rows allocated when the index is created; the files double in size when full
+INITIAL_CAPACITY = 4096
+
+class HashingEmbedder:
+    """Embeds text locally by hashing its words and word pairs into signed buckets (the hashing trick)"""
+    def __init__(self, dimensions=MEMORY_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def embed(self, text):
+        """Unit-length float32 vector for the text; all zeros when it has no words"""
+        words = WORD_PATTERN.findall(text.lower())
+        features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        if not features:
+            return vector
+        # crc32 is stable across processes, unlike hash()
+        hashes = np.fromiter(
+            (zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.uint64, count=len(features)
+        )
+        signs = np.where(hashes >> np.uint64(31), -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, (hashes % np.uint64(self.dimensions)).astype(np.intp), signs)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+def format_memories(turns):
+    """Prompt block for recalled turns, oldest first; empty when nothing was recalled"""
+    if not turns:
+        return ""
+    lines = ["Earlier exchanges with this user that may be relevant:"]
+    for turn in sorted(turns, key=lambda turn: turn["timestamp"]):
+        lines.append(f"User: {turn['message']}\nYou: {turn['response']}")
+    return "\n".join(lines)
+
+class LongTermMemory:
+    """On-disk vector index of every stored turn, searched per user for the turns most similar to a message.
+
+    Files in `directory`:
+        vectors.f32  memory-mapped float32 matrix, one unit vector per turn
+        owners.i64   memory-mapped user id of each turn
+        offsets.i64  memory-mapped (offset, length) of each turn in turns.jsonl
+        turns.jsonl  the turns' text, appended as JSON lines
+        meta.json    number of rows written as of the last flush, and the newest turn's timestamp
+    """
+    def __init__(self, directory=MEMORY_DIR, dimensions=MEMORY_DIMENSIONS, embedder=None,
+                 flush_interval=MEMORY_FLUSH_INTERVAL):
+        self.directory = directory
+        self.dimensions = dimensions
+        self.embedder = embedder or HashingEmbedder(dimensions)
+        self.flush_interval = flush_interval
+        self.count = 0
+        self.capacity = 0
+        self.vectors = None
+        self.owners = None
+        self.offsets = None
+        self.turns_file = None
+        self.turns_end = 0
+        self.user_rows = defaultdict(list)  # user id -> row numbers, oldest first
+        self.newest = None  # timestamp of the newest turn added
+        self.until = None  # timestamp of the newest turn as of the last flush
+        self.lock = threading.Lock()  # flushes run in a worker thread; remapping waits for them
+        self.dirty = False
+        self.flush_task = None
+        self.searches = 0
+        self.search_seconds = 0.0
+
+    def log_info(self, message):
+        """Log info messages with timestamp"""
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        print(f"[{timestamp}] INFO: {message}")
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    @property
+    def is_open(self):
+        return self.vectors is not None
+
+    def open(self):
+        """Map the index files, creating them on first use, and rebuild the per-user row lists"""
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(self.path("meta.json"), "r", encoding="utf-8") as file:
+                meta = json.load(file)
+        except FileNotFoundError:
+            meta = {"dimensions": self.dimensions, "count": 0}
+        if meta["dimensions"] != self.dimensions:
+            raise ValueError(
+                f"Memory index in {self.directory} has {meta['dimensions']} dimensions, "
+                f"MEMORY_DIMENSIONS is {self.dimensions}"
+            )
+        self.count = meta["count"]
+        self.until = self.newest = datetime.fromisoformat(meta["until"]) if meta.get("until") else None
+        self._map(max(INITIAL_CAPACITY, self.count))
+
+        # Rows appended after the last flush are not in meta.json; drop their text as well
+        self.turns_end = int(self.offsets[self.count - 1].sum()) if self.count else 0
+        self.turns_file = open(self.path("turns.jsonl"), "a+b", buffering=0)
+        self.turns_file.truncate(self.turns_end)
+
+        owners = np.asarray(self.owners[:self.count])
+        order = np.argsort(owners, kind="stable")
+        users, starts = np.unique(owners[order], return_index=True)
+        for user, rows in zip(users.tolist(), np.split(order, starts[1:])):
+            self.user_rows[user] = rows.tolist()
+        self.log_info(f"Long-term memory opened: {self.count} turns from {len(self.user_rows)} users")
+
+    def _map(self, capacity):
+        """(Re)map the index files with room for `capacity` rows"""
+        arrays = {}
+        for name, dtype, shape in (
+            ("vectors.f32", np.float32, (capacity, self.dimensions)),
+            ("owners.i64", np.int64, (capacity,)),
+            ("offsets.i64", np.int64, (capacity, 2)),
+        ):
+            path = self.path(name)
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            with open(path, "ab") as file:
+                if file.tell() < size:
+                    file.truncate(size)
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+        with self.lock:
+            self.vectors, self.owners, self.offsets = arrays["vectors.f32"], arrays["owners.i64"], arrays["offsets.i64"]
+            self.capacity = capacity
+
+    def add(self, user_id, message, response, timestamp=None):
+        """Embed and append one turn"""
+        if not self.is_open:
+            return
+        if self.count == self.capacity:
+            self.flush()
+            self._map(self.capacity * 2)
+
+        timestamp = timestamp or datetime.utcnow()
+        record = json.dumps({
+            "user_id": user_id,
+            "message": message,
+            "response": response,
+            "timestamp": timestamp.isoformat()
+        }).encode("utf-8") + b"\n"
+        self.turns_file.write(record)
+
+        row = self.count
+        self.offsets[row] = (self.turns_end, len(record))
+        self.owners[row] = int(user_id)
+        self.vectors[row] = self.embedder.embed(f"{message}\n{response}")
+        self.turns_end += len(record)
+        self.user_rows[int(user_id)].append(row)
+        self.count += 1
+        # After count: a flush that sees the row but an older timestamp only re-adds it after a crash
+        self.newest = max(self.newest, timestamp) if self.newest else timestamp
+        self.dirty = True
+
+    def _read_turn(self, row):
+        offset, length = self.offsets[row]
+        return json.loads(os.pread(self.turns_file.fileno(), int(length), int(offset)))
+
+    def recall(self, user_id, query, top_k=MEMORY_TOP_K, exclude_recent=0, min_score=MEMORY_MIN_SCORE):
+        """The user's top_k past turns most similar to `query`, skipping their newest `exclude_recent` turns"""
+        if not self.is_open:
+            return []
+        started = time.perf_counter()
+        rows = self.user_rows.get(int(user_id), [])
+        if exclude_recent:
+            rows = rows[:-exclude_recent]
+        query_vector = self.embedder.embed(query)
+        if not rows or not query_vector.any():
+            return []
+
+        rows = np.asarray(rows, dtype=np.intp)
+        scores = self.vectors[rows] @ query_vector
+        if len(rows) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            best = np.arange(len(rows))
+        best = best[np.argsort(-scores[best])]
+
+        turns = []
+        for index in best:
+            if scores[index] < min_score:
+                break
+            turn = self._read_turn(rows[index])
+            turn["score"] = float(scores[index])
+            turns.append(turn)
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - started
+        return turns
+
+    def flush(self):
+        """Write mapped pages to disk and record the row count; blocking, so async callers run it in a thread"""
+        with self.lock:
+            if not self.is_open or not self.dirty:
+                return
+            # Rows added while this runs are recorded by the next flush
+            self.dirty = False
+            count, newest = self.count, self.newest
+            try:
+                self.vectors.flush()
+                self.owners.flush()
+                self.offsets.flush()
+                os.fsync(self.turns_file.fileno())
+                temporary = self.path("meta.json.tmp")
+                with open(temporary, "w", encoding="utf-8") as file:
+                    json.dump({
+                        "dimensions": self.dimensions,
+                        "count": count,
+                        "until": newest.isoformat() if newest else None
+                    }, file)
+                os.replace(temporary, self.path("meta.json"))
+            except BaseException:
+                self.dirty = True
+                raise
+            self.until = newest
+
+    async def _flush_loop(self):
+        """Flush every flush_interval seconds"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"Error flushing long-term memory: {str(e)}")
+
+    def start_flushing(self):
+        """Flush the index in the background"""
+        if self.flush_task is None and self.is_open:
+            self.flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop_flushing(self):
+        """Stop the background flush"""
+        if self.flush_task is None:
+            return
+        self.flush_task.cancel()
+        try:
+            await self.flush_task
+        except asyncio.CancelledError:
+            pass
+        self.flush_task = None
+
+    async def close(self):
+        """Flush and unmap the index"""
+        await self.stop_flushing()
+        if not self.is_open:
+            return
+        await asyncio.to_thread(self.flush)
+        self.turns_file.close()
+        self.vectors = self.owners = self.offsets = self.turns_file = None
+
+    def stats(self):
+        """Get memory statistics"""
+        return {
+            "turns": self.count,
+            "users": len(self.user_rows),
+            "searches": self.searches,
+            "avg_search_ms": round(self.search_seconds / self.searches * 1000, 2) if self.searches else 0.0
+        }
@@ -0,0 +1,95 @@
+import time
+from config import STREAM_EDIT_INTERVAL, ERROR_NOTICE_INTERVAL
+
+# Discord rejects messages longer than this
+DISCORD_MESSAGE_LIMIT = 2000
+
+# Shown until the first chunk of a streamed reply arrives
+STREAM_PLACEHOLDER = "✍️ ..."
+
+def split_message(text, limit=DISCORD_MESSAGE_LIMIT):
+    """Split text into Discord-sized parts, preferring newline and space boundaries"""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n ")
+    if text:
+        parts.append(text)
+    return parts
+
+class NoticeThrottle:
+    """Allows at most one error notice per channel every interval seconds"""
+    def __init__(self, interval=ERROR_NOTICE_INTERVAL):
+        self.interval = interval
+        self.last_sent = {}
+        self.suppressed = 0
+
+    def allow(self, channel_id):
+        """Return True and start a new interval if this channel may get a notice now"""
+        now = time.monotonic()
+        last = self.last_sent.get(channel_id)
+        if last is not None and now - last < self.interval:
+            self.suppressed += 1
+            return False
+        self.last_sent[channel_id] = now
+        return True
+
+class StreamingReply:
+    """Posts a placeholder and edits it as chunks arrive, continuing in new messages past the length limit"""
+    def __init__(self, channel, edit_interval=STREAM_EDIT_INTERVAL, limit=DISCORD_MESSAGE_LIMIT):
+        self.channel = channel
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.text = ""
+        self.messages = []
+        self.rendered = []
+        self.last_edit = 0.0
+
+    async def start(self):
+        """Post the placeholder message"""
+        self.messages.append(await self.channel.send(STREAM_PLACEHOLDER))
+        self.rendered.append(STREAM_PLACEHOLDER)
+        self.last_edit = time.monotonic()
+
+    async def append(self, chunk):
+        """Add a chunk, editing the visible messages at most once per edit_interval"""
+        self.text += chunk
+        if time.monotonic() - self.last_edit >= self.edit_interval:
+            await self.flush()
+
+    async def flush(self):
+        """Bring the posted messages in line with the text received so far"""
+        parts = split_message(self.text, self.limit) or [STREAM_PLACEHOLDER]
+        for i, part in enumerate(parts):
+            if i < len(self.messages):
+                if self.rendered[i] != part:
+                    await self.messages[i].edit(content=part)
+                    self.rendered[i] = part
+            else:
+                self.messages.append(await self.channel.send(part))
+                self.rendered.append(part)
+        self.last_edit = time.monotonic()
+
+    async def finish(self, final_text=None):
+        """Render the complete reply, optionally replacing the streamed text"""
+        if final_text is not None:
+            self.text = final_text
+        await self.flush()
+
+    async def abort(self, notice=None):
+        """Replace the posted messages with a notice, or delete them when there is none"""
+        if notice is None:
+            for posted in self.messages:
+                await posted.delete()
+            self.messages, self.rendered = [], []
+            return
+        if self.text:
+            # Keep what was already shown and explain why it stops
+            await self.finish(f"{self.text}\n\n{notice}")
+        else:
+            await self.finish(notice)
@@ -0,0 +1,208 @@
+import asyncio
+import bisect
+import time
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event
+from config import METRICS_HOST, METRICS_PORT
+
+# Seconds; covers fast cache hits through slow Gemini replies
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    """Monotonic count per label combination"""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        self.values[tuple(str(labels[name]) for name in self.labelnames)] += amount
+
+    def samples(self):
+        for labelvalues, value in sorted(self.values.items()):
+            yield self.name + _format_labels(self.labelnames, labelvalues), value
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label combination"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        labelvalues = tuple(str(labels[name]) for name in self.labelnames)
+        series = self.series.get(labelvalues)
+        if series is None:
+            series = self.series[labelvalues] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self):
+        for labelvalues, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield self.name + "_bucket" + _format_labels(self.labelnames, labelvalues, [("le", bound)]), cumulative
+            yield self.name + "_bucket" + _format_labels(self.labelnames, labelvalues, [("le", "+Inf")]), series[-1]
+            yield self.name + "_sum" + _format_labels(self.labelnames, labelvalues), series[-2]
+            yield self.name + "_count" + _format_labels(self.labelnames, labelvalues), series[-1]
+
+class Gauge:
+    """Value read from a callback at scrape time; with labels, the callback returns {label values: value}"""
+    def __init__(self, name, documentation, callback, labelnames=(), kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.kind = kind  # "counter" for totals kept elsewhere, such as bot.message_stats
+
+    def samples(self):
+        value = self.callback()
+        if not self.labelnames:
+            yield self.name, value
+            return
+        for labelvalues, labelled_value in sorted(value.items()):
+            yield self.name + _format_labels(self.labelnames, labelvalues), labelled_value
+
+class MetricsRegistry:
+    """Holds the bot's metrics and renders them in the Prometheus text format"""
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def gauge(self, name, documentation, callback, labelnames=(), kind="gauge"):
+        """Register (or replace) a metric read from a callback"""
+        return self.register(Gauge(name, documentation, callback, labelnames, kind))
+
+    def render(self):
+        """Text exposition of every metric"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for sample, value in metric.samples():
+                    lines.append(f"{sample} {float(value):g}")
+            except Exception as e:
+                lines.append(f"# error reading {metric.name}: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+GEMINI_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "gembot_gemini_request_duration_seconds", "Duration of Gemini calls", ("key", "outcome")
+))
+GEMINI_REQUESTS = REGISTRY.register(Counter(
+    "gembot_gemini_requests_total", "Gemini calls by key and outcome", ("key", "outcome")
+))
+GEMINI_TOKENS = REGISTRY.register(Counter(
+    "gembot_gemini_tokens_total", "Estimated reply tokens received from Gemini, by key", ("key",)
+))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "gembot_db_query_duration_seconds", "Duration of database statements", ("statement",)
+))
+REPLY_SECONDS = REGISTRY.register(Histogram(
+    "gembot_reply_latency_seconds", "Time from receiving a message to finishing its reply", ("outcome",)
+))
+
+def key_label(key):
+    """Masked key used as a label value"""
+    return f"...{key[-4:]}"
+
+def observe_gemini(key, outcome, seconds):
+    """Record one Gemini call"""
+    GEMINI_REQUEST_SECONDS.observe(seconds, key=key_label(key), outcome=outcome)
+    GEMINI_REQUESTS.inc(key=key_label(key), outcome=outcome)
+
+def instrument_engine(sync_engine):
+    """Time every statement the engine executes, labelled by its SQL verb"""
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement=verb)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def drop_timer(context):
+        # A failed statement never reaches after_cursor_execute; drop its start so later ones line up
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    return sync_engine
+
+class MetricsServer:
+    """Minimal asyncio HTTP server answering GET /metrics; runs on the bot's event loop without blocking it"""
+    def __init__(self, registry=REGISTRY, host=METRICS_HOST, port=METRICS_PORT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def log_info(self, message):
+        """Log info messages with timestamp"""
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        print(f"[{timestamp}] INFO: {message}")
+
+    async def start(self):
+        """Start listening when a port is configured"""
+        if self.server is not None or not self.port:
+            return
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.log_info(f"Metrics available at http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        """Stop listening"""
+        if self.server is None:
+            return
+        self.server.close()
+        await self.server.wait_closed()
+        self.server = None
+
+    async def _handle(self, reader, writer):
+        """Answer one HTTP request and close the connection"""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Drain the headers; the request has no body we care about
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.registry.render().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status, body, content_type = "404 Not Found", b"Not Found\n", "text/plain"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
@@ -1,18 +1,100 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, DateTime, Boolean, Index, select, insert, text, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, SQLITE_TUNING,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT_MS
+)
 import datetime
 
 # Create base class for declarative models
 Base = declarative_base()
 
+def is_memory_sqlite(url):
+    """Whether a SQLite URL points at an in-memory database"""
+    return ":memory:" in url or url.endswith("://")
+
+def sqlite_pragmas(url=DATABASE_URL):
+    """PRAGMA statements run on every new SQLite connection"""
+    pragmas = [
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        # A negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    # In-memory databases cannot use WAL
+    if not is_memory_sqlite(url):
+        pragmas.insert(0, f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    return pragmas
+
+def apply_sqlite_pragmas(sync_engine, url=DATABASE_URL):
+    """Run the SQLite pragmas on each connection the engine opens"""
+    pragmas = sqlite_pragmas(url)
+
+    @event.listens_for(sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return sync_engine
+
+def build_engine(url=DATABASE_URL, tuned=SQLITE_TUNING):
+    """Create the sync engine, with the SQLite performance pragmas when enabled"""
+    sync_engine = create_engine(url)
+    if tuned and url.startswith("sqlite"):
+        apply_sqlite_pragmas(sync_engine, url)
+    return sync_engine
+
 # Create database engine
-engine = create_engine(DATABASE_URL)
+engine = build_engine()
 
 # Create session factory
 Session = sessionmaker(bind=engine)
 
+def get_async_database_url(url=DATABASE_URL):
+    """Translate a sync DATABASE_URL into the matching async driver URL"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url[len("postgres://"):]
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    return url
+
+def create_async_db_engine(url=DATABASE_URL, tuned=SQLITE_TUNING):
+    """Create an async engine with pool sizing from config and, for SQLite, the performance pragmas"""
+    async_url = get_async_database_url(url)
+    pool_options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    if not async_url.startswith("sqlite"):
+        return create_async_engine(async_url, **pool_options)
+    
+    if is_memory_sqlite(async_url):
+        # In-memory databases live on a single connection
+        async_db_engine = create_async_engine(async_url)
+    else:
+        # aiosqlite defaults to NullPool; keep connections around instead
+        pool_options["poolclass"] = AsyncAdaptedQueuePool
+        async_db_engine = create_async_engine(async_url, **pool_options)
+    if tuned:
+        apply_sqlite_pragmas(async_db_engine.sync_engine, url)
+    return async_db_engine
+
+# Create async database engine and session factory
+async_engine = create_async_db_engine()
+AsyncSessionFactory = async_sessionmaker(async_engine, expire_on_commit=False)
+
 class ChatHistory(Base):
     """Store chat history for each user"""
     __tablename__ = 'chat_history'
@@ -27,9 +109,32 @@ class ChatHistory(Base):
         nullable=False
     )
 
+    __table_args__ = (
+        # Serves the per-user "newest N turns" lookup and trim
+        Index('ix_chat_history_user_id_timestamp', user_id, timestamp.desc()),
+    )
+
     def __repr__(self):
         return f"<ChatHistory(user_id='{self.user_id}', timestamp='{self.timestamp}')>"
 
+class ConversationSummary(Base):
+    """Rolling summary of each user's turns that no longer fit in the prompt"""
+    __tablename__ = 'conversation_summary'
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, unique=True, nullable=False)
+    summary = Column(String, nullable=False, default="")
+    summarized_until = Column(DateTime, nullable=True)  # Timestamp of the newest folded turn
+    updated_at = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow,
+        nullable=False
+    )
+
+    def __repr__(self):
+        return f"<ConversationSummary(user_id='{self.user_id}', summarized_until='{self.summarized_until}')>"
+
 class ChannelConfig(Base):
     """Store channel configuration for each guild"""
     __tablename__ = 'channel_config'
@@ -49,9 +154,92 @@ class ChannelConfig(Base):
         nullable=False
     )
 
+    __table_args__ = (
+        Index('uq_channel_config_guild_id', guild_id, unique=True),
+    )
+
     def __repr__(self):
         return f"<ChannelConfig(guild_id='{self.guild_id}', channel_id='{self.channel_id}')>"
 
+class ChannelSettings(Base):
+    """Per-channel feature switches; NULL means use the global default"""
+    __tablename__ = 'channel_settings'
+    
+    id = Column(Integer, primary_key=True)
+    channel_id = Column(String, unique=True, nullable=False)
+    guild_id = Column(String, nullable=False)
+    response_cache = Column(Boolean, nullable=True)
+    context_mode = Column(String, nullable=True)  # 'user' or 'channel'
+    updated_at = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow,
+        nullable=False
+    )
+
+    def __repr__(self):
+        return f"<ChannelSettings(channel_id='{self.channel_id}', response_cache={self.response_cache})>"
+
+class ChannelMessage(Base):
+    """Recent messages of channel-mode channels, trimmed to the context window"""
+    __tablename__ = 'channel_message'
+    
+    id = Column(Integer, primary_key=True)
+    channel_id = Column(String, nullable=False)
+    message_id = Column(String, nullable=True)  # NULL for the bot's own replies
+    author_id = Column(String, nullable=False)
+    author_name = Column(String, nullable=False)
+    content = Column(String, nullable=False)
+    is_self = Column(Boolean, default=False, nullable=False)  # the bot's own reply; other bots are speakers
+    timestamp = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        nullable=False
+    )
+
+    __table_args__ = (
+        # Serves the per-channel "newest N messages" lookup and trim
+        Index('ix_channel_message_channel_id_timestamp', channel_id, timestamp.desc()),
+    )
+
+    def __repr__(self):
+        return f"<ChannelMessage(channel_id='{self.channel_id}', author='{self.author_name}')>"
+
+class GuildPersona(Base):
+    """Per-guild persona prompt that replaces prompt.txt in that guild"""
+    __tablename__ = 'guild_persona'
+    
+    id = Column(Integer, primary_key=True)
+    guild_id = Column(String, unique=True, nullable=False)
+    prompt = Column(String, nullable=False)
+    modified_by = Column(String, nullable=False)
+    updated_at = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow,
+        nullable=False
+    )
+
+    def __repr__(self):
+        return f"<GuildPersona(guild_id='{self.guild_id}', modified_by='{self.modified_by}')>"
+
+class ResponseCacheEntry(Base):
+    """Cached reply for a normalized prompt, keyed by a hash of persona, temperature and message"""
+    __tablename__ = 'response_cache'
+    
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String(64), unique=True, nullable=False)
+    response = Column(String, nullable=False)
+    created_at = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        nullable=False,
+        index=True
+    )
+
+    def __repr__(self):
+        return f"<ResponseCacheEntry(cache_key='{self.cache_key}', created_at='{self.created_at}')>"
+
 class BotSettings(Base):
     """Store global bot settings"""
     __tablename__ = 'bot_settings'
@@ -73,6 +261,34 @@ class BotSettings(Base):
     def __repr__(self):
         return f"<BotSettings(temperature={self.temperature})>"
 
+class ApiKeyHealth(Base):
+    """Persisted health and usage of each API key, restored at startup"""
+    __tablename__ = 'api_key_health'
+    
+    id = Column(Integer, primary_key=True)
+    key_id = Column(String(16), unique=True, nullable=False)  # Hash prefix; raw keys are never stored
+    errors = Column(Integer, default=0, nullable=False)
+    last_error = Column(DateTime, nullable=True)
+    total_requests = Column(Integer, default=0, nullable=False)
+    last_request = Column(DateTime, nullable=True)
+    cooldown_until = Column(DateTime, nullable=True)
+    consecutive_failures = Column(Integer, default=0, nullable=False)
+    breaker_state = Column(String, default="closed", nullable=False)
+    breaker_failures = Column(Integer, default=0, nullable=False)
+    breaker_opened_at = Column(DateTime, nullable=True)
+    quota_date = Column(String, nullable=True)  # UTC date (YYYY-MM-DD) the daily counters belong to
+    daily_requests = Column(Integer, default=0, nullable=False)
+    daily_tokens = Column(Integer, default=0, nullable=False)
+    updated_at = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow,
+        nullable=False
+    )
+
+    def __repr__(self):
+        return f"<ApiKeyHealth(key_id='{self.key_id}', errors={self.errors}, breaker='{self.breaker_state}')>"
+
 class UserAccess(Base):
     """Store user access controls (blacklist/whitelist)"""
     __tablename__ = 'user_access'
@@ -93,10 +309,67 @@ class UserAccess(Base):
         status = "blacklisted" if self.is_blacklisted else "whitelisted"
         return f"<UserAccess(user_id='{self.user_id}', status='{status}')>"
 
+class SchemaVersion(Base):
+    """Record of applied schema migrations"""
+    __tablename__ = 'schema_version'
+    
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        nullable=False
+    )
+
+    def __repr__(self):
+        return f"<SchemaVersion(version={self.version}, description='{self.description}')>"
+
+def _add_lookup_indexes(connection):
+    """Index per-user history lookups and make guild_id unique"""
+    # Older databases may hold several rows per guild; keep the newest one
+    connection.execute(text(
+        "DELETE FROM channel_config WHERE id NOT IN "
+        "(SELECT MAX(id) FROM channel_config GROUP BY guild_id)"
+    ))
+    for table in (ChatHistory.__table__, ChannelConfig.__table__):
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+def _add_channel_context_mode(connection):
+    """Add the per-channel context mode switch to existing channel_settings tables"""
+    columns = {column["name"] for column in inspect(connection).get_columns(ChannelSettings.__tablename__)}
+    if "context_mode" not in columns:
+        connection.execute(text("ALTER TABLE channel_settings ADD COLUMN context_mode VARCHAR"))
+
+# Ordered list of (version, description, migration function); append only
+MIGRATIONS = [
+    (1, "Add chat history and channel config indexes", _add_lookup_indexes),
+    (2, "Add channel_settings.context_mode", _add_channel_context_mode),
+]
+
+def run_migrations(bind=engine):
+    """Apply pending migrations, each in its own transaction"""
+    SchemaVersion.__table__.create(bind, checkfirst=True)
+    with bind.connect() as connection:
+        applied = set(connection.execute(select(SchemaVersion.version)).scalars())
+    
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        with bind.begin() as connection:
+            migrate(connection)
+            connection.execute(insert(SchemaVersion).values(
+                version=version,
+                description=description,
+                applied_at=datetime.datetime.utcnow()
+            ))
+        print(f"Applied migration {version}: {description}")
+
 def init_db():
-    """Initialize the database by creating all tables"""
+    """Initialize the database by creating all tables and applying migrations"""
     try:
         Base.metadata.create_all(engine)
+        run_migrations(engine)
         print("Database initialized successfully!")
         
         # Create initial bot settings if they don't exist
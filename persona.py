@@ -0,0 +1,114 @@
+import asyncio
+import os
+from datetime import datetime
+from config import PERSONA_FILE, PERSONA_POLL_INTERVAL
+
+DEFAULT_PERSONA = """You are a friendly anime character. Your responses should be:
+1. In character and consistent
+2. Family-friendly and appropriate
+3. Engaging and interactive
+4. Written in a natural conversational style"""
+
+class PersonaManager:
+    """Keeps the persona prompt in memory, reloading it when the file changes, plus per-guild overrides"""
+    def __init__(self, path=PERSONA_FILE, poll_interval=PERSONA_POLL_INTERVAL, on_reload=None):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.on_reload = on_reload  # called with no arguments after the persona changes
+        self.prompt = None
+        self.mtime = None
+        self.guild_overrides = {}
+        self.reloads = 0
+        self.watch_task = None
+
+    def log_info(self, message):
+        """Log info messages with timestamp"""
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        print(f"[{timestamp}] INFO: {message}")
+
+    def load(self):
+        """Read the persona file, creating it with the default prompt if it does not exist"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self.prompt = file.read().strip()
+        except FileNotFoundError:
+            print(f"Warning: {self.path} not found! Creating with default prompt...")
+            with open(self.path, 'w', encoding='utf-8') as file:
+                file.write(DEFAULT_PERSONA)
+            self.prompt = DEFAULT_PERSONA
+        self.mtime = os.stat(self.path).st_mtime
+        return self.prompt
+
+    def reload(self):
+        """Re-read the persona file and notify listeners"""
+        self.load()
+        self.reloads += 1
+        self.log_info(f"Persona reloaded from {self.path}")
+        if self.on_reload:
+            self.on_reload()
+        return self.prompt
+
+    def check_for_changes(self):
+        """Reload if the file's mtime changed; returns True when a reload happened"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self.mtime:
+            return False
+        self.reload()
+        return True
+
+    def get(self, guild_id=None):
+        """Return the persona for a guild: its override if set, else the file persona"""
+        override = self.guild_overrides.get(guild_id)
+        if override:
+            return override
+        if self.prompt is None:
+            self.load()
+        return self.prompt
+
+    def set_overrides(self, overrides):
+        """Replace the per-guild overrides with a snapshot from the database"""
+        self.guild_overrides = dict(overrides)
+
+    def set_override(self, guild_id, prompt):
+        """Set or (with None) remove one guild's override"""
+        # Pooled chats compare their persona on reuse, so only this guild's sessions are rebuilt
+        if prompt is None:
+            self.guild_overrides.pop(guild_id, None)
+        else:
+            self.guild_overrides[guild_id] = prompt
+
+    async def _watch_loop(self):
+        """Check the persona file every poll_interval seconds"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                self.check_for_changes()
+            except Exception as e:
+                print(f"Error reloading persona: {str(e)}")
+
+    def start_watching(self):
+        """Poll the persona file's mtime in the background"""
+        if self.watch_task is None and self.poll_interval > 0:
+            self.watch_task = asyncio.create_task(self._watch_loop())
+
+    async def stop_watching(self):
+        """Stop the background file watcher"""
+        if self.watch_task is None:
+            return
+        self.watch_task.cancel()
+        try:
+            await self.watch_task
+        except asyncio.CancelledError:
+            pass
+        self.watch_task = None
+
+    def stats(self):
+        """Get persona statistics"""
+        return {
+            "file": self.path,
+            "reloads": self.reloads,
+            "guild_overrides": len(self.guild_overrides)
+        }
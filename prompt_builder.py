@@ -0,0 +1,147 @@
+import asyncio
+import sys
+import traceback
+from datetime import datetime
+from config import PROMPT_TOKEN_BUDGET, SUMMARY_TOKEN_BUDGET, SUMMARY_FOLD_TURNS, DEBUG_MODE
+
+# Rough average for English text with Gemini's tokenizer
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    """Estimate the token count of a piece of text without calling the API"""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_to_tokens(text, max_tokens, keep="end"):
+    """Cut text down to roughly max_tokens, keeping its start or its end"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[-max_chars:] if keep == "end" else text[:max_chars]
+
+def format_turns(turns):
+    """Format history entries (oldest first) as user/assistant messages"""
+    formatted = []
+    for turn in turns:
+        formatted.append({"role": "user", "content": turn.message})
+        formatted.append({"role": "assistant", "content": turn.response})
+    return formatted
+
+class PromptBuilder:
+    """Fits conversation history into a token budget, newest turns first"""
+    def __init__(self, token_budget=PROMPT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+
+    def turn_tokens(self, turn):
+        return estimate_tokens(turn.message) + estimate_tokens(turn.response)
+
+    def fit_history(self, fixed_text, turns):
+        """Split turns (oldest first) into those that fit beside fixed_text and the older overflow"""
+        remaining = self.token_budget - estimate_tokens(fixed_text)
+        kept = 0
+        for turn in reversed(turns):
+            cost = self.turn_tokens(turn)
+            if cost > remaining:
+                break
+            remaining -= cost
+            kept += 1
+        
+        split = len(turns) - kept
+        return turns[split:], turns[:split]
+
+class ConversationSummarizer:
+    """Folds turns that leave the prompt window into a rolling per-user summary, off the reply path"""
+    def __init__(self, ai, db, token_budget=SUMMARY_TOKEN_BUDGET, fold_turns=SUMMARY_FOLD_TURNS):
+        self.ai = ai
+        self.db = db
+        self.token_budget = token_budget
+        self.fold_turns = fold_turns
+        self.pending = {}
+        self.queued_until = {}
+        self.tasks = {}
+        self.folded_turns = 0
+        self.failures = 0
+
+    def log_error(self, message, error=None):
+        """Log error messages with timestamp"""
+        current_time = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        error_message = f"[{current_time}] ERROR: {message}"
+        if error and DEBUG_MODE:
+            error_message += f"\n{traceback.format_exc()}"
+        print(error_message, file=sys.stderr)
+
+    def unsummarized(self, user_id, turns, summary):
+        """Drop turns (oldest first) already folded into the summary or queued for folding"""
+        cutoff = max(
+            (t for t in (summary.summarized_until, self.queued_until.get(user_id)) if t),
+            default=None
+        )
+        if cutoff is None:
+            return turns
+        return [turn for turn in turns if turn.timestamp > cutoff]
+
+    def fold(self, user_id, turns):
+        """Summarize turns (oldest first) due to leave the prompt once fold_turns of them are waiting.
+
+        Nothing is held in memory meanwhile: turns stay in stored history until they are summarized
+        (HISTORY_STORED_TURNS keeps one batch beyond the window), so a partial batch is found again on
+        the user's next message, after a restart as well.
+        """
+        if len(turns) >= self.fold_turns:
+            self.queue(user_id, turns)
+
+    def queue(self, user_id, turns):
+        """Queue turns for summarization; one background task per user applies them in order"""
+        self.pending.setdefault(user_id, []).extend(turns)
+        self.queued_until[user_id] = max(turn.timestamp for turn in turns)
+        if user_id not in self.tasks:
+            self.tasks[user_id] = asyncio.create_task(self._run(user_id))
+
+    def fallback_summary(self, previous, turns):
+        """Extractive summary used when the model call fails: append the turns and keep the newest text"""
+        lines = [previous] if previous else []
+        for turn in turns:
+            lines.append(f"User said: {turn.message}")
+            lines.append(f"You replied: {turn.response}")
+        return truncate_to_tokens("\n".join(lines), self.token_budget)
+
+    async def _run(self, user_id):
+        """Apply queued turns to the stored summary until none are left"""
+        try:
+            while self.pending.get(user_id):
+                turns = self.pending.pop(user_id)
+                previous = await self.db.get_summary(user_id)
+                try:
+                    summary = await self.ai.summarize_async(previous.summary, turns, self.token_budget)
+                except Exception as e:
+                    self.failures += 1
+                    self.log_error(f"Summarization failed for user {user_id}, using fallback", e)
+                    summary = self.fallback_summary(previous.summary, turns)
+                
+                summary = truncate_to_tokens(summary, self.token_budget)
+                await self.db.save_summary(user_id, summary, max(turn.timestamp for turn in turns))
+                self.folded_turns += len(turns)
+        except Exception as e:
+            self.log_error(f"Could not update summary for user {user_id}", e)
+        finally:
+            self.tasks.pop(user_id, None)
+            self.queued_until.pop(user_id, None)
+
+    async def drain(self, timeout):
+        """Wait up to timeout seconds for queued summaries, then cancel the rest"""
+        tasks = list(self.tasks.values())
+        if not tasks:
+            return
+        _, unfinished = await asyncio.wait(tasks, timeout=timeout)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+
+    def stats(self):
+        """Get summarizer statistics"""
+        return {
+            "folded_turns": self.folded_turns,
+            "active_tasks": len(self.tasks),
+            "failures": self.failures
+        }
@@ -0,0 +1,138 @@
+import asyncio
+import random
+import time
+from google.api_core import exceptions as google_exceptions
+from google.generativeai.types import generation_types
+from config import RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+
+# Error categories returned by classify_error
+RETRYABLE = "retryable"  # Transient upstream failure: retry after backoff
+RATE_LIMITED = "rate_limited"  # Quota exhausted on this key: back the key off, retry on another
+KEY_INVALID = "key_invalid"  # Key rejected: take the key out of rotation, retry on another
+FATAL = "fatal"  # The request itself is bad or blocked: retrying cannot help
+
+class GenerationError(Exception):
+    """Raised when a reply cannot be generated; `user_message` is safe to show in Discord"""
+    def __init__(self, user_message, category=RETRYABLE):
+        super().__init__(user_message)
+        self.user_message = user_message
+        self.category = category
+
+def classify_error(error):
+    """Map an exception from the Gemini SDK to one of the error categories"""
+    if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        return RATE_LIMITED
+    if isinstance(error, (google_exceptions.Unauthenticated, google_exceptions.PermissionDenied)):
+        return KEY_INVALID
+    if isinstance(error, (google_exceptions.InvalidArgument, google_exceptions.BadRequest)):
+        # The API reports a malformed key as a bad request
+        if "api key" in str(error).lower():
+            return KEY_INVALID
+        return FATAL
+    if isinstance(error, (
+        generation_types.BlockedPromptException,
+        generation_types.StopCandidateException,
+        google_exceptions.NotFound,
+        ValueError,
+    )):
+        return FATAL
+    return RETRYABLE
+
+def retry_after_seconds(error):
+    """Read the server's RetryInfo delay from an API error, if it sent one"""
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    return None
+
+class RetryPolicy:
+    """Bounded retries with full-jitter exponential backoff"""
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, category, attempt):
+        """Whether to try again after `attempt` (0-based) failed with `category`"""
+        return category != FATAL and attempt + 1 < self.max_attempts
+
+    def delay(self, attempt):
+        """Backoff before the next attempt, picked uniformly up to the exponential ceiling"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def sleep(self, attempt):
+        """Wait out the backoff for the next attempt"""
+        await asyncio.sleep(self.delay(attempt))
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single probe through once reset_timeout has passed"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = None
+        self.times_opened = 0
+
+    def available(self, now=None):
+        """Whether a call may go through now (does not change state)"""
+        now = now or time.monotonic()
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return now - self.opened_at >= self.reset_timeout
+        # Half-open: one probe at a time; a probe that never reported back expires
+        return self.probe_started_at is None or now - self.probe_started_at >= self.reset_timeout
+
+    def allow(self, now=None):
+        """Check availability and, when recovering, claim the half-open probe"""
+        now = now or time.monotonic()
+        if not self.available(now):
+            return False
+        if self.state != self.CLOSED:
+            self.state = self.HALF_OPEN
+            self.probe_started_at = now
+        return True
+
+    def record_success(self):
+        """Close the breaker and clear the failure count"""
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probe_started_at = None
+
+    def record_failure(self):
+        """Count a failure, opening the breaker at the threshold or on a failed probe"""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self):
+        """Open the breaker immediately"""
+        if self.state != self.OPEN:
+            self.times_opened += 1
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.probe_started_at = None
+
+    def retry_in(self, now=None):
+        """Seconds until the breaker will let a probe through"""
+        now = now or time.monotonic()
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - now)
+
+    def stats(self):
+        """Get breaker statistics"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "retry_in": f"{self.retry_in():.0f}s"
+        }
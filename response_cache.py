@@ -0,0 +1,110 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from config import (
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_HISTORY
+)
+
+# Longer messages rarely repeat, so they are not worth a cache lookup
+MAX_CACHEABLE_CHARS = 300
+
+# Prune the database table after this many stores
+PRUNE_EVERY = 100
+
+def normalize_message(text):
+    """Lowercase, drop punctuation and collapse whitespace so trivially different prompts match"""
+    text = re.sub(r"[^\w\s]", "", text.lower())
+    return " ".join(text.split())
+
+def history_bucket(history_length):
+    """Coarse conversation length: new, short or long"""
+    if history_length == 0:
+        return "new"
+    return "short" if history_length <= 3 else "long"
+
+class ResponseCache:
+    """TTL + LRU cache of replies in memory, backed by the response_cache table"""
+    def __init__(self, db, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                 history_mode=RESPONSE_CACHE_HISTORY, default_enabled=RESPONSE_CACHE_ENABLED):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.history_mode = history_mode
+        self.default_enabled = default_enabled
+        self.entries = OrderedDict()  # cache key -> (response, expires_at)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def enabled_for(self, channel_id):
+        """Whether replies in this channel may be served from the cache"""
+        enabled = self.db.hot_cache.get_response_cache(channel_id)
+        return self.default_enabled if enabled is None else enabled
+
+    def make_key(self, persona_prompt, temperature, message, history_length=0):
+        """Build the cache key for a prompt, or None if the message is not cacheable"""
+        normalized = normalize_message(message)
+        if not normalized or len(normalized) > MAX_CACHEABLE_CHARS:
+            return None
+        persona_hash = hashlib.sha256(persona_prompt.encode("utf-8")).hexdigest()
+        bucket = history_bucket(history_length) if self.history_mode == "bucket" else "any"
+        raw = "\x1f".join([persona_hash, f"{temperature:.2f}", bucket, normalized])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, cache_key):
+        """Return the cached reply for a key, checking memory first and then the database"""
+        now = time.monotonic()
+        entry = self.entries.get(cache_key)
+        if entry is not None:
+            response, expires_at = entry
+            if expires_at > now:
+                self.entries.move_to_end(cache_key)
+                self.memory_hits += 1
+                return response
+            del self.entries[cache_key]
+
+        row = await self.db.get_cached_response(cache_key, self.ttl)
+        if row is None:
+            self.misses += 1
+            return None
+
+        # Keep the entry only for what is left of its database TTL
+        age = (datetime.utcnow() - row.created_at).total_seconds()
+        self._remember(cache_key, row.response, now + self.ttl - age)
+        self.disk_hits += 1
+        return row.response
+
+    async def put(self, cache_key, response):
+        """Store a reply in memory and the database"""
+        self._remember(cache_key, response, time.monotonic() + self.ttl)
+        await self.db.save_cached_response(cache_key, response)
+        self.stores += 1
+        if self.stores % PRUNE_EVERY == 0:
+            await self.db.prune_response_cache(self.ttl, self.max_entries)
+
+    async def clear(self):
+        """Drop every cached reply"""
+        self.entries.clear()
+        await self.db.clear_response_cache()
+
+    def _remember(self, cache_key, response, expires_at):
+        self.entries[cache_key] = (response, expires_at)
+        self.entries.move_to_end(cache_key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        """Get cache statistics"""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "entries_in_memory": len(self.entries),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": f"{(hits / lookups * 100) if lookups else 0:.1f}%"
+        }
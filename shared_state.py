@@ -0,0 +1,245 @@
+import asyncio
+import copy
+import functools
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from config import SHARED_STATE_PATH, SQLITE_BUSY_TIMEOUT_MS
+from key_scheduler import KeyScheduler, RATE_WINDOW
+
+# Timestamps are time.monotonic() values. CLOCK_MONOTONIC is system-wide, so processes on one
+# host agree on it; it restarts at boot, which is why the launcher resets the store on start.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS key_usage (
+    key_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    requests INTEGER NOT NULL,
+    tokens INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_key_usage_ts ON key_usage (ts);
+CREATE TABLE IF NOT EXISTS key_health (
+    key_id TEXT PRIMARY KEY,
+    cooldown_until REAL NOT NULL,
+    consecutive_failures INTEGER NOT NULL,
+    last_dispatch REAL NOT NULL,
+    breaker_state TEXT NOT NULL,
+    breaker_failures INTEGER NOT NULL,
+    opened_at REAL NOT NULL,
+    probe_started_at REAL,
+    times_opened INTEGER NOT NULL,
+    quota_date TEXT,
+    daily_requests INTEGER NOT NULL DEFAULT 0,
+    daily_tokens INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+def key_id(key):
+    """Stable identifier for a key, so raw API keys are never written to disk"""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+class SharedKeyStore:
+    """SQLite file holding key usage and health for every worker process on this host"""
+    def __init__(self, path=SHARED_STATE_PATH):
+        self.path = path
+        # Used from the scheduler's store thread as well as the event loop, one caller at a time
+        self.connection = sqlite3.connect(
+            path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(key_health)")}
+        if "quota_date" not in columns:
+            # Written by a version without daily usage; the state only lasts a boot, so start over
+            self.reset()
+
+    @contextmanager
+    def transaction(self):
+        """Exclusive write transaction, so check-and-reserve is atomic across processes"""
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        else:
+            self.connection.execute("COMMIT")
+
+    def reset(self):
+        """Forget all usage and health (done by the launcher before starting workers)"""
+        with self.transaction() as connection:
+            # Recreated rather than emptied, so a file from an older schema picks up new columns
+            connection.execute("DROP TABLE key_usage")
+            connection.execute("DROP TABLE key_health")
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+
+    def close(self):
+        self.connection.close()
+
+class SharedKeyScheduler(KeyScheduler):
+    """KeyScheduler whose usage windows, backoff and breakers live in a SharedKeyStore.
+
+    Every change is a BEGIN IMMEDIATE transaction that may wait on other workers, so async callers go
+    through run(), which executes it on a single store thread instead of the event loop. Reads that
+    come from the loop (headroom, stats, daily usage, health export) are served from `view`, a copy of
+    the key states taken at the end of each transaction, and never touch the store.
+    """
+    def __init__(self, keys, store, **limits):
+        super().__init__(keys, **limits)
+        self.store = store
+        self.key_ids = {key: key_id(key) for key in keys}
+        self.connection = None  # set while a shared transaction is open
+        self.owner = None  # thread running the open transaction
+        self.view = KeyScheduler(keys, self.rpm_limit, self.tpm_limit, self.rpd_limit)
+        self.lock = threading.RLock()  # one transaction at a time across the loop and the store thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-keys")
+
+    @contextmanager
+    def shared(self):
+        """Load the shared state, run the caller's changes, and write them back in one transaction"""
+        with self.lock:
+            if self.connection is not None:
+                # Nested call (e.g. try_acquire -> record_tokens): already inside the transaction
+                yield self.connection
+                return
+            with self.store.transaction() as connection:
+                self.connection = connection
+                self.owner = threading.get_ident()
+                try:
+                    self._load(connection, time.monotonic())
+                    yield connection
+                    self._save(connection)
+                finally:
+                    self.connection = None
+                    self.owner = None
+            # Swapped in whole, so readers on the loop see either the old copy or the new one
+            self.view.states = copy.deepcopy(self.states)
+
+    def in_transaction(self):
+        return self.owner == threading.get_ident()
+
+    async def run(self, method, *args):
+        """Call one of this scheduler's methods on the store thread, keeping SQLite off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args))
+
+    def _load(self, connection, now):
+        """Replace the in-memory key states with the shared ones"""
+        cutoff = now - RATE_WINDOW
+        connection.execute("DELETE FROM key_usage WHERE ts <= ?", (cutoff,))
+        for key, state in self.states.items():
+            rows = connection.execute(
+                "SELECT ts, requests, tokens FROM key_usage WHERE key_id = ? ORDER BY ts",
+                (self.key_ids[key],)
+            ).fetchall()
+            state.requests = deque(ts for ts, requests, _ in rows if requests)
+            state.tokens = deque((ts, tokens) for ts, _, tokens in rows if tokens)
+            state.token_total = sum(tokens for _, tokens in state.tokens)
+
+            health = connection.execute(
+                "SELECT cooldown_until, consecutive_failures, last_dispatch, breaker_state, breaker_failures, "
+                "opened_at, probe_started_at, times_opened, quota_date, daily_requests, daily_tokens "
+                "FROM key_health WHERE key_id = ?",
+                (self.key_ids[key],)
+            ).fetchone()
+            if health is None:
+                continue
+            (state.cooldown_until, state.consecutive_failures, state.last_dispatch, state.breaker.state,
+             state.breaker.failures, state.breaker.opened_at, state.breaker.probe_started_at,
+             state.breaker.times_opened, state.quota_date, state.daily_requests, state.daily_tokens) = health
+
+    def _save(self, connection):
+        """Write every key's backoff and breaker state back to the store"""
+        connection.executemany(
+            "INSERT OR REPLACE INTO key_health (key_id, cooldown_until, consecutive_failures, last_dispatch, "
+            "breaker_state, breaker_failures, opened_at, probe_started_at, times_opened, quota_date, "
+            "daily_requests, daily_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (self.key_ids[key], state.cooldown_until, state.consecutive_failures, state.last_dispatch,
+                 state.breaker.state, state.breaker.failures, state.breaker.opened_at,
+                 state.breaker.probe_started_at, state.breaker.times_opened, state.quota_date,
+                 state.daily_requests, state.daily_tokens)
+                for key, state in self.states.items()
+            ]
+        )
+
+    def try_acquire(self, estimated_tokens=0, exclude=()):
+        with self.shared() as connection:
+            key = super().try_acquire(estimated_tokens, exclude)
+            if key is not None:
+                connection.execute(
+                    "INSERT INTO key_usage (key_id, ts, requests, tokens) VALUES (?, ?, 1, 0)",
+                    (self.key_ids[key], self.states[key].last_dispatch)
+                )
+            return key
+
+    def next_available_in(self, exclude=()):
+        with self.shared():
+            return super().next_available_in(exclude)
+
+    def record_tokens(self, key, tokens, now=None):
+        if not tokens:
+            return
+        now = now or time.monotonic()
+        with self.shared() as connection:
+            super().record_tokens(key, tokens, now)
+            connection.execute(
+                "INSERT INTO key_usage (key_id, ts, requests, tokens) VALUES (?, ?, 0, ?)",
+                (self.key_ids[key], now, tokens)
+            )
+
+    def record_success(self, key):
+        with self.shared():
+            super().record_success(key)
+
+    def record_completion(self, key, tokens):
+        # Success, tokens and daily usage in one transaction, so every worker counts against one quota
+        with self.shared():
+            return super().record_completion(key, tokens)
+
+    def record_failure(self, key, retry_after=None, breaker_failure=True, trip=False):
+        with self.shared():
+            return super().record_failure(key, retry_after, breaker_failure, trip)
+
+    def cool_down(self, key, seconds):
+        with self.shared():
+            super().cool_down(key, seconds)
+
+    def restore_health(self, key, health):
+        with self.shared():
+            super().restore_health(key, health)
+
+    def headroom(self, key, now=None):
+        if self.in_transaction():
+            # Called by try_acquire: use the state just loaded
+            return super().headroom(key, now)
+        return self.view.headroom(key, now)
+
+    def is_available(self, key, now=None):
+        return self.view.is_available(key, now)
+
+    def daily_usage(self, key):
+        return self.view.daily_usage(key)
+
+    def export_health(self, key):
+        return self.view.export_health(key)
+
+    def stats(self, key):
+        return self.view.stats(key)
+
+    def close(self):
+        """Finish queued store writes and close the store"""
+        self.executor.shutdown(wait=True)
+        self.store.close()
+
+def create_key_scheduler(keys, path=SHARED_STATE_PATH):
+    """KeyScheduler shared through SHARED_STATE_PATH when it is set, else in-process"""
+    if path:
+        return SharedKeyScheduler(keys, SharedKeyStore(path))
+    return KeyScheduler(keys)